@@ -0,0 +1,209 @@
+"""JSON-API över queries.py för andra interna verktyg, utan Streamlit.
+
+Appen är en ren ASGI-applikation och körs t.ex. med uvicorn:
+
+    uvicorn api:app --port 8000
+    uvicorn api:app --port 8000 --workers 4 --no-access-log
+
+Varje worker laddar dataseten en gång vid start, från ögonblicksbilden om den
+är aktuell. Svaren är JSON:
+
+    GET /occupations/{id}?region={region-id}            yrke med annonser, prognos och lön
+    GET /occupations/{id}/similar?region={region-id}    närliggande yrken
+    GET /groups/{yrkesgrupps-id}/ads?location={ort-id}  annonser nu och 2024
+    GET /localities/{tätorts-id}                        närliggande tätorter
+    GET /educations/{ssyk}?locality={tätorts-id}        utbildningar, ev. i pendlingsområdet
+    GET /search?q={text}&limit=20                       yrkesbenämningar
+    GET /bulk?occupations={id},{id}&locations={id},{id}&format=csv|parquet
+                                                        yrken x orter, se bulk_query.py
+    GET /health
+    GET /metrics                                        Prometheus-text
+
+region och location är som standard hela Sverige och okända områden ger 400.
+Färdiga svar cachas per sökväg och fråga, dataseten ändras inte medan
+processen kör.
+"""
+import asyncio
+import functools
+import io
+import json
+import threading
+import time
+import traceback
+from urllib.parse import parse_qs
+from bulk_query import bulk_query, to_arrow, write_csv
+from concept_index import SWEDEN_ID
+from datastore import DERIVED_DATASETS, Datasets
+from metrics import metrics
+from snapshot import open_snapshot
+import queries
+
+RESPONSE_CACHE_SIZE = 8192
+
+class NotFound(Exception):
+    pass
+
+datasets = None
+datasets_lock = threading.Lock()
+
+def load_datasets():
+    global datasets
+    with datasets_lock:
+        if datasets is not None:
+            return
+        data = Datasets(snapshot = open_snapshot())
+        for name in DERIVED_DATASETS:
+            getattr(data, name)
+        datasets = data
+
+def found(value):
+    if value is None:
+        raise NotFound()
+    return value
+
+def location(params, name):
+    """Län, kommun eller hela Sverige ur frågan. Okända id:n ger ValueError och 400."""
+    location_id = params.get(name, SWEDEN_ID)
+    if location_id not in datasets.concepts.locations:
+        raise ValueError(f"Okänt område: {location_id}")
+    return location_id
+
+def occupation(params, id_occupation):
+    return found(queries.occupation_summary(datasets, id_occupation, location(params, "region")))
+
+def similar(params, id_occupation):
+    return found(queries.similar_occupations(datasets, id_occupation, location(params, "region")))
+
+def ads(params, occupation_group_id):
+    now, historical = queries.get_ads(datasets, occupation_group_id, location(params, "location"))
+    return {"occupation_group_id": occupation_group_id, "ads_now": now, "ads_2024": historical}
+
+def localities(params, locality_id):
+    locations = queries.list_locations(datasets, locality_id)
+    return found(locations or None)
+
+def educations(params, ssyk_code):
+    return queries.get_educations(datasets, ssyk_code, params.get("locality"))
+
+def search(params):
+    limit = max(1, min(int(params.get("limit", 20)), 100))
+    valid = datasets.valid_occupations
+    return [{"id": valid.get(name), "name": name, "label": label, "kind": kind}
+            for name, label, kind in datasets.occupation_search.search(params.get("q", ""), limit)]
+
+def health(params):
+    return {"status": "ok", "datasets": len(datasets.touched)}
+
+# Sökvägarnas delar, där None är ett id som skickas till funktionen.
+ROUTES = [
+    (("occupations", None), occupation),
+    (("occupations", None, "similar"), similar),
+    (("groups", None, "ads"), ads),
+    (("localities", None), localities),
+    (("educations", None), educations),
+    (("search",), search),
+    (("health",), health)]
+
+def route(parts):
+    for pattern, handler in ROUTES:
+        if len(pattern) == len(parts) and all(p is None or p == part for p, part in zip(pattern, parts)):
+            return handler, [part for p, part in zip(pattern, parts) if p is None]
+    raise NotFound()
+
+@functools.lru_cache(maxsize = RESPONSE_CACHE_SIZE)
+def respond(path, query_string):
+    """(status, JSON som bytes) för en GET-förfrågan."""
+    try:
+        handler, arguments = route([p for p in path.split("/") if p])
+        params = {k: v[0] for k, v in parse_qs(query_string).items()}
+        body = handler(params, *arguments)
+        status = 200
+    except NotFound:
+        body = {"error": "not found"}
+        status = 404
+    except ValueError as error:
+        body = {"error": str(error)}
+        status = 400
+    return status, json.dumps(body, ensure_ascii = False).encode("utf-8")
+
+def bulk_response(query_string):
+    """(status, innehåll, content-type) för /bulk.
+
+    Utelämnade occupations eller locations betyder alla yrken respektive alla
+    län och Sverige. format är csv (standard) eller parquet, som kräver pyarrow.
+    """
+    params = {k: v[0] for k, v in parse_qs(query_string).items()}
+    ids = {k: [i for i in params.get(k, "").split(",") if i] for k in ("occupations", "locations")}
+    output_format = params.get("format", "csv")
+    try:
+        if output_format not in ("csv", "parquet"):
+            raise ValueError(f"Okänt format: {output_format}, välj csv eller parquet")
+        if output_format == "parquet":
+            try:
+                import pyarrow.parquet
+            except ImportError:
+                raise ValueError("Parquet kräver pyarrow på servern")
+        result = bulk_query(datasets, ids["occupations"], ids["locations"])
+    except ValueError as error:
+        return 400, json.dumps({"error": str(error)}, ensure_ascii = False).encode("utf-8"), b"application/json; charset=utf-8"
+    if output_format == "parquet":
+        output = io.BytesIO()
+        pyarrow.parquet.write_table(to_arrow(result), output)
+        return 200, output.getvalue(), b"application/vnd.apache.parquet"
+    output = io.StringIO()
+    write_csv(result, output)
+    return 200, output.getvalue().encode("utf-8"), b"text/csv; charset=utf-8"
+
+async def send_response(send, status, body, content_type = b"application/json; charset=utf-8"):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                load_datasets()
+            except Exception as error:
+                await send({"type": "lifespan.startup.failed", "message": str(error)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    try:
+        await handle(scope, send)
+    except Exception:
+        # Oväntade fel loggas och blir ett JSON-svar i stället för att nå ASGI-servern.
+        traceback.print_exc()
+        await send_response(send, 500, b'{"error": "internal server error"}')
+
+async def handle(scope, send):
+    if datasets is None:
+        await asyncio.to_thread(load_datasets)
+    if scope["method"] != "GET":
+        await send_response(send, 405, b'{"error": "method not allowed"}')
+        return
+    if scope["path"] == "/metrics":
+        await send_response(send, 200, metrics.prometheus_text().encode(), b"text/plain; version=0.0.4")
+        return
+    if scope["path"] == "/bulk":
+        # Korsprodukten och CSV-skrivningen kan ta sekunder och körs i en tråd så att andra förfrågningar inte väntar.
+        status, body, content_type = await asyncio.to_thread(bulk_response, scope["query_string"].decode("utf-8", "replace"))
+        await send_response(send, status, body, content_type)
+        return
+    # Uppslagen tar mikrosekunder, så de körs direkt i eventloopen i stället för i en tråd.
+    start = time.perf_counter()
+    status, body = respond(scope["path"], scope["query_string"].decode("utf-8", "replace"))
+    metrics.observe("api", time.perf_counter() - start)
+    await send_response(send, status, body)
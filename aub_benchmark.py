@@ -0,0 +1,72 @@
+"""Mäter hur sammanslagningen av SUSA-utbildningar och tillfällen skalar.
+
+Syntetiska svar i dagens storlek och 10 och 100 gånger större strömmas genom
+samma kedja som import_aub_from_susa använder:
+
+    python aub_benchmark.py --scales 1 10 100
+
+Tiden för att bara generera posterna mäts separat och dras av, så att
+siffrorna visar sammanslagningen och inte testdatat.
+"""
+import argparse
+import random
+import time
+from aub_susa import aub_per_ssyk, aub_utbildningar, utbildningsorter
+
+BASE_INFOS = 10000
+EVENTS_PER_INFO = 2
+AUB_SHARE = 0.08
+SSYK_CODES = [f"{c:04d}" for c in range(1110, 9700, 37)]
+TOWNS = [f"Ort {i}" for i in range(300)]
+
+def syntetiska_utbildningar(count, seed = 1):
+    rng = random.Random(seed)
+    for i in range(count):
+        subject = [{"type": "Education_Subject", "code": "x"}]
+        if rng.random() < AUB_SHARE:
+            subject += [{"type": "AUB_Subject", "code": c} for c in rng.sample(SSYK_CODES, rng.randint(1, 3))]
+        yield {
+            "identifier": f"i.syn.{i}",
+            "subject": subject,
+            "title": {"string": [{"lang": "swe", "content": f"Utbildning {i}"}]},
+            "description": {"string": [{"lang": "swe", "content": f"<![CDATA[Beskrivning av utbildning {i}. {'Text ' * 40}]]>"}]},
+            "url": {"url": [{"content": f"https://example.org/utbildning/{i}"}]}}
+
+def syntetiska_tillfällen(count, seed = 2):
+    rng = random.Random(seed)
+    for i in range(count * EVENTS_PER_INFO):
+        yield {
+            "identifier": f"e.syn.{i}",
+            "education": f"i.syn.{rng.randrange(count)}",
+            "location": [{"town": t} for t in rng.sample(TOWNS, rng.randint(1, 3))]}
+
+def mät(funktion):
+    start = time.perf_counter()
+    result = funktion()
+    return result, time.perf_counter() - start
+
+def benchmark(scales, repeat = 1):
+    print(f"{'skala':>6} {'utbildningar':>13} {'tillfällen':>11} {'generering':>11} {'sammanslagning':>15} {'poster/s':>10} {'SSYK-poster':>12}")
+    for scale in scales:
+        count = BASE_INFOS * scale
+        bästa_generering = bästa_total = float("inf")
+        for _ in range(repeat):
+            _, generering = mät(lambda: (sum(1 for _ in syntetiska_tillfällen(count)), sum(1 for _ in syntetiska_utbildningar(count))))
+            utbildningsdata, total = mät(lambda: aub_per_ssyk(
+                aub_utbildningar(syntetiska_utbildningar(count)), utbildningsorter(syntetiska_tillfällen(count))))
+            bästa_generering = min(bästa_generering, generering)
+            bästa_total = min(bästa_total, total)
+        sammanslagning = max(bästa_total - bästa_generering, 1e-9)
+        poster = count * (1 + EVENTS_PER_INFO)
+        print(f"{scale:>5}x {count:>13} {count * EVENTS_PER_INFO:>11} {bästa_generering:>10.2f}s {sammanslagning:>14.2f}s "
+              f"{poster / sammanslagning:>10.0f} {sum(map(len, utbildningsdata.values())):>12}")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Mät sammanslagningen av SUSA-data på syntetiska svar.")
+    parser.add_argument("--scales", type = int, nargs = "+", default = [1, 10, 100])
+    parser.add_argument("--repeat", type = int, default = 1)
+    args = parser.parse_args()
+    benchmark(args.scales, args.repeat)
+
+if __name__ == "__main__":
+    main()
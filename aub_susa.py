@@ -1,62 +1,267 @@
+import argparse
+import hashlib
 import json
+import os
 import requests
 import operator
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def ladda_ner_api(uri):
-    response = requests.get(url = uri)
-    data = response.text
-    json_data = json.loads(data)
-    return json_data
+SUSA_API = "https://susanavet2.skolverket.se/api/1.1"
+PAGE_SIZE = 1000
+TIMEOUT = (10, 120)
+STATE_FILE = "susa_state.json"
+UTBILDNINGSDATA_FILE = "utbildningsdata.json"
 
-def hämta_yrkesutbildningar():
-    uri = "https://susanavet2.skolverket.se/api/1.1/infos?vocational=true&page=0&size=20000000"
-    json_data = ladda_ner_api(uri)
-    return json_data
+class Progress:
+    """Räknare för en nedladdning: sidor, poster, byte, genomströmning och tid per anrop."""
 
-def hämta_utbildningstillfällen():
-    uri = "https://susanavet2.skolverket.se/api/1.1/events?vocational=True&page=0&size=20000000"
-    json_data = ladda_ner_api(uri)
-    return json_data
+    def __init__(self, name):
+        self.name = name
+        self.pages = 0
+        self.items = 0
+        self.bytes = 0
+        self.request_times = []
+        self.start = time.perf_counter()
 
-def spara_aub_med_ssyk(utbildningar, utb_tillfällen):
+    def update(self, items, size, seconds):
+        self.pages += 1
+        self.items += items
+        self.bytes += size
+        self.request_times.append(seconds)
+        print(self.report())
+
+    def report(self):
+        seconds = max(time.perf_counter() - self.start, 1e-9)
+        slowest = max(self.request_times, default = 0)
+        return f"{self.name}: {self.pages} sidor, {self.items} poster, {self.bytes / 1e6:.1f} MB, {self.items / seconds:.0f} poster/s, {self.bytes / 1e6 / seconds:.1f} MB/s, senaste anrop {self.request_times[-1]:.2f} s, längsta {slowest:.2f} s"
+
+def skapa_session(retries = 4, backoff = 0.5):
+    """Session med återanvända anslutningar, gzip och begränsade omförsök med backoff."""
+    session = requests.Session()
+    retry = Retry(total = retries, backoff_factor = backoff,
+                  status_forcelist = (429, 500, 502, 503, 504), allowed_methods = ["GET"])
+    adapter = HTTPAdapter(pool_connections = 2, pool_maxsize = 4, max_retries = retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = "gzip"
+    return session
+
+def ladda_ner_api(uri, params = None, session = None):
+    start = time.perf_counter()
+    response = (session or requests).get(url = uri, params = params, timeout = TIMEOUT)
+    response.raise_for_status()
+    json_data = response.json()
+    return json_data, len(response.content), time.perf_counter() - start
+
+def ladda_ner_sidor(uri, params, progress = None, session = None):
+    """Generator över posterna i ett SUSA-svar, hämtade en sida i taget."""
+    page = 0
+    while True:
+        json_data, size, seconds = ladda_ner_api(uri, {**params, "page": page, "size": PAGE_SIZE}, session)
+        content = json_data.get("content") or []
+        if progress:
+            progress.update(len(content), size, seconds)
+        yield from content
+        page += 1
+        if not content or page >= json_data.get("totalPages", page + 1):
+            break
+
+def hämta_yrkesutbildningar(api = SUSA_API, progress = None, session = None):
+    for i in ladda_ner_sidor(f"{api}/infos", {"vocational": "true"}, progress, session):
+        yield i["content"]["educationInfo"]
+
+def hämta_utbildningstillfällen(api = SUSA_API, progress = None, session = None):
+    for i in ladda_ner_sidor(f"{api}/events", {"vocational": "True"}, progress, session):
+        yield i["content"]["educationEvent"]
+
+def aub_utbildningar(utbildningar):
+    return [info for info in utbildningar if aub_ssyk(info)]
+
+def orter_i_tillfälle(info):
+    return [str(l["town"]) for l in info.get("location", []) if "town" in l]
+
+def utbildningsorter(utb_tillfällen):
+    """Alla orter per utbildning, samlade över utbildningens tillfällen i den ordning de först förekommer."""
     utb_id_orter = {}
-    for i in utb_tillfällen["content"]:
-        info = i["content"]["educationEvent"]
-        if "location" in info:
-            orter = []
-            for l in info["location"]:
-                if "town" in l:
-                    orter.append(str(l["town"]))
-            if orter:
-                utb_id_orter[info["education"]] = orter
+    for info in utb_tillfällen:
+        orter = orter_i_tillfälle(info)
+        if orter:
+            utb_id_orter.setdefault(info["education"], {}).update(dict.fromkeys(orter))
+    return {id: list(orter) for id, orter in utb_id_orter.items()}
+
+def aub_ssyk(info):
+    return [str(s["code"]) for s in info.get("subject", []) if s["type"] == "AUB_Subject"]
+
+def aub_post(info):
+    return {
+        "utbildningsnamn": info["title"]["string"][0]["content"],
+        "beskrivning": info["description"]["string"][0]["content"].replace("<![CDATA[", "").replace("]]>", ""),
+        "url": info["url"]["url"][0]["content"]}
+
+def aub_index(kurser):
+    """Hash-join av kurser till {(ssyk, ort): [post]}.
+
+    kurser är (ssyk-koder, post, orter) per utbildning. Varje utbildning ger en
+    post per ort och samma postobjekt delas av alla utbildningens SSYK-koder.
+    """
+    index = {}
+    for ssyk, post, orter in kurser:
+        for ort in orter:
+            ort_post = {**post, "ort": ort}
+            for s in ssyk:
+                poster = index.get((s, ort))
+                if poster is None:
+                    index[(s, ort)] = [ort_post]
+                else:
+                    poster.append(ort_post)
+    return index
+
+def per_ssyk(index):
+    """{ssyk: [post]} sorterat på ort, med kursernas inbördes ordning inom varje ort."""
     utbildningsdata = {}
-    for i in utbildningar["content"]:
-        info = i["content"]["educationInfo"]
+    for (s, ort), poster in sorted(index.items(), key = lambda x: x[0][1]):
+        utbildningsdata.setdefault(s, []).extend(poster)
+    return utbildningsdata
+
+def aub_kurser(utbildningar, utb_id_orter):
+    for info in utbildningar:
+        orter = utb_id_orter.get(info["identifier"])
+        if orter:
+            ssyk = aub_ssyk(info)
+            if ssyk:
+                yield ssyk, aub_post(info), orter
+
+def aub_per_ssyk(utbildningar, utb_id_orter):
+    return per_ssyk(aub_index(aub_kurser(utbildningar, utb_id_orter)))
+
+def spara_aub_med_ssyk(utbildningar, utb_tillfällen):
+    utb_id_orter = utbildningsorter(i["content"]["educationEvent"] for i in utb_tillfällen["content"])
+    return aub_per_ssyk((i["content"]["educationInfo"] for i in utbildningar["content"]), utb_id_orter)
+
+def import_aub_from_susa(api = SUSA_API):
+    # Båda endpoints hämtas samtidigt. Tillfällena blir ort per utbildning och av
+    # utbildningarna sparas bara de med AUB-ämne, så inget fullt svar hålls i minnet.
+    start = time.perf_counter()
+    with skapa_session() as session, ThreadPoolExecutor(2) as executor:
+        orter = executor.submit(utbildningsorter, hämta_utbildningstillfällen(api, Progress("events"), session))
+        aub = executor.submit(aub_utbildningar, hämta_yrkesutbildningar(api, Progress("infos"), session))
+        bara_aub = aub_per_ssyk(aub.result(), orter.result())
+    print(f"Hämtade AUB från SUSA på {time.perf_counter() - start:.1f} s")
+    return bara_aub
+
+def innehållshash(post):
+    return hashlib.sha1(json.dumps(post, sort_keys = True, ensure_ascii = False).encode("utf-8")).hexdigest()
+
+def läs_json(filename, default):
+    if not os.path.exists(filename):
+        return default
+    with open(filename, encoding = "utf-8") as file:
+        return json.load(file)
+
+def skriv_json(filename, data):
+    temporary = f"{filename}.tmp"
+    with open(temporary, "w", encoding = "utf-8") as file:
+        json.dump(data, file, ensure_ascii = False, indent = 2, separators = (", ", ": "))
+    os.replace(temporary, filename)
+
+def jämför_tillfällen(utb_tillfällen, tidigare, nu):
+    """Orter per utbildning med hash och senast sedd. Returnerar tillståndet och id:n vars orter ändrats."""
+    orter = {id: {"hash": innehållshash(o), "orter": o, "last_seen": nu}
+             for id, o in utbildningsorter(utb_tillfällen).items()}
+    ändrade = {id for id, o in orter.items() if tidigare.get(id, {}).get("hash") != o["hash"]}
+    ändrade.update(set(tidigare) - set(orter))
+    return orter, ändrade
+
+def jämför_utbildningar(utbildningar, tidigare, nu):
+    """AUB-utbildningar med hash och senast sedd. Bara nya eller ändrade poster bearbetas om."""
+    aub = {}
+    ändrade = set()
+    for info in utbildningar:
+        ssyk = aub_ssyk(info)
+        if not ssyk:
+            continue
         id = info["identifier"]
-        tillfällen = utb_id_orter.get(id)
-        if tillfällen:
-            if "subject" in info:
-                ssyk = []
-                for s in info["subject"]:
-                    if s ["type"] == "AUB_Subject":
-                        ssyk.append(s["code"])
-                if ssyk:
-                    ssyk = [str(i) for i in ssyk]
-                    for s in ssyk:
-                        if not s in utbildningsdata:
-                            utbildningsdata[s] = []
-                        data = {
-                            "utbildningsnamn": info["title"]["string"][0]["content"],
-                            "beskrivning": info["description"]["string"][0]["content"].replace("<![CDATA[", "").replace("]]>", ""),
-                            "url": info["url"]["url"][0]["content"],
-                            "ort": tillfällen[0]}
-                        utbildningsdata[s].append(data)
-    for key in utbildningsdata:
-        utbildningsdata[key] = sorted(utbildningsdata[key], key = operator.itemgetter("ort"))
+        hash = innehållshash(info)
+        gammal = tidigare.get(id)
+        if gammal and gammal["hash"] == hash:
+            aub[id] = {**gammal, "last_seen": nu}
+        else:
+            aub[id] = {"hash": hash, "ssyk": ssyk, "post": aub_post(info), "last_seen": nu}
+            ändrade.add(id)
+    ändrade.update(set(tidigare) - set(aub))
+    return aub, ändrade
+
+def aub_patch(tillstånd, tidigare, ändrade_id):
+    """Fullständiga AUB-listor för de SSYK-koder som berörs av ändrade utbildningar."""
+    berörda = set()
+    for id in ändrade_id:
+        berörda.update(tidigare["utbildningar"].get(id, {}).get("ssyk", []))
+        berörda.update(tillstånd["utbildningar"].get(id, {}).get("ssyk", []))
+    kurser = []
+    for id, utbildning in tillstånd["utbildningar"].items():
+        orter = tillstånd["orter"].get(id)
+        ssyk = [s for s in utbildning["ssyk"] if s in berörda]
+        if orter and ssyk:
+            kurser.append((ssyk, {"utbildningstyp": "aub", **utbildning["post"]}, orter["orter"]))
+    patch = {s: [] for s in berörda}
+    patch.update(per_ssyk(aub_index(kurser)))
+    return patch
+
+def slå_ihop(utbildningsdata, patch, alla = False):
+    """Ersätt AUB-posterna för SSYK-koderna i patch. Övriga utbildningstyper behålls.
+
+    Med alla = True tas AUB-poster bort även för SSYK-koder som inte finns i patch.
+    """
+    koder = set(utbildningsdata) if alla else set()
+    koder.update(patch)
+    for s in koder:
+        behållna = [u for u in utbildningsdata.get(s, []) if u["utbildningstyp"] != "aub"]
+        sammanslagna = sorted(behållna + patch.get(s, []), key = operator.itemgetter("ort"))
+        if sammanslagna:
+            utbildningsdata[s] = sammanslagna
+        else:
+            utbildningsdata.pop(s, None)
     return utbildningsdata
 
-def import_aub_from_susa():
-    yrkesutb = hämta_yrkesutbildningar()
-    utb_tillfällen_data = hämta_utbildningstillfällen()
-    bara_aub = spara_aub_med_ssyk(yrkesutb, utb_tillfällen_data)
-    return bara_aub
\ No newline at end of file
+def uppdatera_aub(api = SUSA_API, state_file = STATE_FILE):
+    """Hämta SUSA och räkna fram en patch mot förra körningen enligt state_file.
+
+    Utan tidigare tillstånd blir patchen fullständig och ska ersätta alla AUB-poster.
+    """
+    tidigare = läs_json(state_file, None)
+    fullständig = tidigare is None
+    tidigare = tidigare or {"utbildningar": {}, "orter": {}}
+    nu = time.strftime("%Y-%m-%dT%H:%M:%S")
+    start = time.perf_counter()
+    with skapa_session() as session, ThreadPoolExecutor(2) as executor:
+        orter = executor.submit(jämför_tillfällen, hämta_utbildningstillfällen(api, Progress("events"), session), tidigare["orter"], nu)
+        utbildningar = executor.submit(jämför_utbildningar, hämta_yrkesutbildningar(api, Progress("infos"), session), tidigare["utbildningar"], nu)
+        tillstånd_orter, ändrade_orter = orter.result()
+        tillstånd_utbildningar, ändrade_utbildningar = utbildningar.result()
+    tillstånd = {"utbildningar": tillstånd_utbildningar, "orter": tillstånd_orter}
+    ändrade = ändrade_utbildningar | ändrade_orter
+    patch = aub_patch(tillstånd, tidigare, ändrade)
+    print(f"{len(ändrade)} nya, ändrade eller borttagna utbildningar, {len(patch)} SSYK-koder i patchen, {time.perf_counter() - start:.1f} s")
+    return patch, fullständig, tillstånd
+
+def main():
+    parser = argparse.ArgumentParser(description = "Uppdatera arbetsmarknadsutbildningarna i utbildningsdata.json från SUSA.")
+    parser.add_argument("--api", default = SUSA_API)
+    parser.add_argument("--state", default = STATE_FILE)
+    parser.add_argument("--file", default = UTBILDNINGSDATA_FILE)
+    parser.add_argument("--patch", help = "Skriv patchen hit i stället för att slå ihop den med --file")
+    args = parser.parse_args()
+
+    patch, fullständig, tillstånd = uppdatera_aub(args.api, args.state)
+    if args.patch:
+        skriv_json(args.patch, {"fullständig": fullständig, "ssyk": patch})
+    else:
+        skriv_json(args.file, slå_ihop(läs_json(args.file, {}), patch, fullständig))
+    # Tillståndet sparas sist så att en avbruten körning görs om nästa gång.
+    skriv_json(args.state, tillstånd)
+
+if __name__ == "__main__":
+    main()
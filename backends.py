@@ -0,0 +1,216 @@
+"""Lagring av objekt i en GCS-bucket, en lokal katalog eller i minnet med samma gränssnitt.
+
+Objekten adresseras med namn som 'feedback/20250101T120000-ab12cd34.ndjson'.
+FileBackend och MemoryBackend gör att koden som använder lagringen kan köras
+och provas utan GCS. open_backend väljer backend från en adress:
+
+    gs://bucket/prefix    GCSBackend
+    file:///sökväg        FileBackend, liksom en vanlig sökväg
+    memory://namn         MemoryBackend, samma instans för samma adress i processen
+
+Alla backends har read_if_changed, som bara hämtar innehållet när objektets
+ETag skiljer sig från den man redan har. DatasetCache använder det för att
+hämta datasetfilerna från en bucket till en lokal katalog.
+"""
+import hashlib
+import os
+import threading
+from google.cloud import storage
+
+class FileBackend:
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split("/"))
+
+    def read(self, name):
+        """Objektets innehåll som bytes, eller None om det saknas."""
+        try:
+            with open(self.path(name), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def etag(self, name):
+        try:
+            stat = os.stat(self.path(name))
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+    def read_if_changed(self, name, etag):
+        """(innehåll, etag) om objektet ändrats sedan etag, (None, etag) om inte och (None, None) om det saknas."""
+        current = self.etag(name)
+        if current is None or current == etag:
+            return None, current
+        return self.read(name), current
+
+    def write(self, name, data, content_type = None):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+    def delete(self, name):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix = ""):
+        """Namnen på alla objekt som börjar med prefix, sorterade."""
+        names = []
+        for directory, _, files in os.walk(self.root):
+            for file in files:
+                if file.endswith(".tmp"):
+                    continue
+                name = os.path.relpath(os.path.join(directory, file), self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    names.append(name)
+        return sorted(names)
+
+class MemoryBackend:
+    """Objekt i en dict, för prover och för körningar som inte ska lämna spår."""
+
+    def __init__(self, objects = None):
+        self.objects = dict(objects or {})
+        self.lock = threading.Lock()
+
+    def read(self, name):
+        with self.lock:
+            return self.objects.get(name)
+
+    def read_if_changed(self, name, etag):
+        with self.lock:
+            data = self.objects.get(name)
+        if data is None:
+            return None, None
+        current = hashlib.md5(data).hexdigest()
+        if current == etag:
+            return None, current
+        return data, current
+
+    def write(self, name, data, content_type = None):
+        with self.lock:
+            self.objects[name] = bytes(data)
+
+    def delete(self, name):
+        with self.lock:
+            self.objects.pop(name, None)
+
+    def list(self, prefix = ""):
+        with self.lock:
+            return sorted(n for n in self.objects if n.startswith(prefix))
+
+memory_backends = {}
+memory_backends_lock = threading.Lock()
+
+def memory_backend(address):
+    """En MemoryBackend per adress och process, så att skrivare och läsare med samma adress ser samma objekt."""
+    with memory_backends_lock:
+        return memory_backends.setdefault(address, MemoryBackend())
+
+gcs_clients = {}
+gcs_clients_lock = threading.Lock()
+
+def gcs_client(credentials = None):
+    """En storage.Client per projekt och process. Klienten återanvänder sina HTTP-anslutningar."""
+    key = credentials.project_id if credentials is not None else None
+    with gcs_clients_lock:
+        client = gcs_clients.get(key)
+        if client is None:
+            if credentials is None:
+                client = storage.Client()
+            else:
+                client = storage.Client(credentials = credentials, project = credentials.project_id)
+            gcs_clients[key] = client
+        return client
+
+class GCSBackend:
+    def __init__(self, bucket_name, credentials = None, prefix = ""):
+        self.bucket = gcs_client(credentials).bucket(bucket_name)
+        self.prefix = prefix
+
+    def blob_name(self, name):
+        return f"{self.prefix}{name}"
+
+    def read(self, name):
+        blob = self.bucket.blob(self.blob_name(name))
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+
+    def read_if_changed(self, name, etag):
+        # Metadata först, så att oförändrade objekt inte laddas ner. Generationen
+        # låser nedladdningen till samma version som ETag:en kom från.
+        blob = self.bucket.get_blob(self.blob_name(name))
+        if blob is None:
+            return None, None
+        if blob.etag == etag:
+            return None, etag
+        return blob.download_as_bytes(if_generation_match = blob.generation), blob.etag
+
+    def write(self, name, data, content_type = None):
+        self.bucket.blob(self.blob_name(name)).upload_from_string(data, content_type = content_type)
+
+    def delete(self, name):
+        self.bucket.blob(self.blob_name(name)).delete()
+
+    def list(self, prefix = ""):
+        start = len(self.prefix)
+        return sorted(blob.name[start:] for blob in self.bucket.list_blobs(prefix = self.blob_name(prefix)))
+
+def open_backend(address, credentials = None):
+    if address.startswith("gs://"):
+        bucket_name, _, prefix = address[len("gs://"):].partition("/")
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        return GCSBackend(bucket_name, credentials, prefix)
+    if address.startswith("memory://"):
+        return memory_backend(address)
+    if address.startswith("file://"):
+        address = address[len("file://"):]
+    return FileBackend(address)
+
+class DatasetCache:
+    """Hämtar datasetfiler från en backend till cache_dir och hämtar bara om ändrade filer.
+
+    ETag:en för varje fil sparas bredvid filen. Går backend inte att nå används
+    den senast hämtade filen.
+    """
+
+    def __init__(self, backend, cache_dir = "dataset_cache"):
+        self.backend = backend
+        self.cache_dir = cache_dir
+
+    def fetch(self, filename):
+        path = os.path.join(self.cache_dir, filename)
+        etag_path = f"{path}.etag"
+        etag = None
+        if os.path.exists(path) and os.path.exists(etag_path):
+            with open(etag_path) as file:
+                etag = file.read().strip()
+        try:
+            data, current = self.backend.read_if_changed(filename, etag)
+        except Exception as error:
+            if etag is None:
+                raise
+            print(f"Kunde inte kontrollera {filename}, använder cachad fil: {error}")
+            return path
+        if current is None:
+            raise FileNotFoundError(filename)
+        if data is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok = True)
+            with open(f"{path}.tmp", "wb") as file:
+                file.write(data)
+            os.replace(f"{path}.tmp", path)
+            with open(etag_path, "w") as file:
+                file.write(current)
+        return path
+
+    def fetch_all(self, files):
+        """Samma namn som files men med sökvägar till de hämtade filerna."""
+        return {name: self.fetch(filename) for name, filename in files.items()}
@@ -0,0 +1,163 @@
+"""Annonser, prognos och lön för många yrken och orter på en gång.
+
+Resultatet är kolumnvis med en rad per yrke och ort. Annonser och prognoser
+hämtas med numpy-indexering direkt ur AdIndex- och ForecastIndex-matriserna,
+så hela korsprodukten av alla yrkesbenämningar och alla län tar bråkdelen av
+en sekund. Skrivs som CSV, eller som Parquet om pyarrow finns:
+
+    python bulk_query.py --occupations ghs4_JXU_BYt GPNi_fJR_B2B --output urval.csv
+    python bulk_query.py --occupations-file yrken.txt --locations CaRE_1nn_cSU --output skåne.parquet
+    python bulk_query.py --benchmark
+
+Utan --occupations tas alla yrkesbenämningar med och utan --locations alla län och hela Sverige.
+"""
+import argparse
+import csv
+import io
+import sys
+import time
+import numpy as np
+from concept_index import SWEDEN_ID
+from datastore import Datasets
+from snapshot import open_snapshot
+
+COLUMNS = [
+    "occupation_id", "occupation_name", "occupation_group_id", "ssyk", "location_id", "location_name",
+    "ads_now", "ads_2024", "job_opportunities", "forecast", "salary_p10", "salary_mean", "salary_p90"]
+
+def salary_value(value):
+    # SCB redovisar saknade värden som '..'.
+    return int(value) if value and value.isdigit() else None
+
+def default_locations(data):
+    return [*data.concepts.regions.ids, SWEDEN_ID]
+
+def location_names(data):
+    names = {region_id: name for name, region_id in data.regions.items()}
+    names.update(data.municipality_id_namn)
+    names[SWEDEN_ID] = "Sverige"
+    return names
+
+def bulk_query(data, occupation_ids = None, location_ids = None):
+    """{kolumn: numpy-array} med en rad per (yrkesbenämning, ort), yrkesvis i indataordning.
+
+    Okända id:n ger ValueError. Saknade prognoser och löner är None.
+    """
+    occupation_ids = list(occupation_ids or data.valid_occupations.values())
+    location_ids = list(location_ids or default_locations(data))
+    unknown = [o for o in occupation_ids if o not in data.occupationdata]
+    unknown += [l for l in location_ids if l not in data.concepts.locations]
+    if unknown:
+        raise ValueError(f"Okända id:n: {', '.join(unknown[:10])}")
+
+    ad_index = data.ad_index
+    forecast_index = data.forecast_index
+    # Uppslagen görs en gång per yrke och ort, korsprodukten bara med numpy.
+    group_rows = np.empty(len(occupation_ids), dtype = np.int64)
+    barometer_rows = np.empty(len(occupation_ids), dtype = np.int64)
+    names, group_ids, ssyk_codes, salaries = [], [], [], []
+    for i, occupation_id in enumerate(occupation_ids):
+        info = data.occupationdata[occupation_id]
+        row = ad_index.groups.get(info["occupation_group_id"])
+        group_rows[i] = -1 if row is None else row
+        row = forecast_index.barometers.get(info["barometer_id"]) if info["barometer_id"] else None
+        barometer_rows[i] = -1 if row is None else row
+        names.append(info["preferred_label"])
+        group_ids.append(info["occupation_group_id"])
+        ssyk_codes.append(info["occupation_group"][0:4])
+        salaries.append([salary_value(v) for v in data.ssyk_salary.get(ssyk_codes[-1]) or [None] * 3])
+    columns = np.array([data.concepts.locations.get(l) for l in location_ids], dtype = np.int64)
+
+    # Rader som saknas pekar på rad 0 och nollas eller maskas efteråt.
+    has_group = (group_rows >= 0)[:, None]
+    ads_now = np.where(has_group, ad_index.ads_now[np.maximum(group_rows, 0)[:, None], columns], 0)
+    ads_2024 = np.where(has_group, ad_index.ads_2024[np.maximum(group_rows, 0)[:, None], columns], 0)
+    codes = forecast_index.codes[np.maximum(barometer_rows, 0)[:, None], columns]
+    codes = np.where((barometer_rows >= 0)[:, None], codes, -1).ravel()
+
+    labels = forecast_index.labels
+    opportunities = np.array([l[0] for l in labels] + [None], dtype = object)
+    forecasts = np.array([l[1] for l in labels] + [None], dtype = object)
+    # Kod -1 hamnar på det sista elementet, None.
+    codes = np.where(codes < 0, len(labels), codes)
+
+    n, m = len(occupation_ids), len(location_ids)
+    place_names = location_names(data)
+    salaries = np.array(salaries, dtype = object).reshape(n, 3)
+    return {
+        "occupation_id": np.repeat(np.array(occupation_ids, dtype = object), m),
+        "occupation_name": np.repeat(np.array(names, dtype = object), m),
+        "occupation_group_id": np.repeat(np.array(group_ids, dtype = object), m),
+        "ssyk": np.repeat(np.array(ssyk_codes, dtype = object), m),
+        "location_id": np.tile(np.array(location_ids, dtype = object), n),
+        "location_name": np.tile(np.array([place_names.get(l) for l in location_ids], dtype = object), n),
+        "ads_now": ads_now.ravel(),
+        "ads_2024": ads_2024.ravel(),
+        "job_opportunities": opportunities[codes],
+        "forecast": forecasts[codes],
+        "salary_p10": np.repeat(salaries[:, 0], m),
+        "salary_mean": np.repeat(salaries[:, 1], m),
+        "salary_p90": np.repeat(salaries[:, 2], m)}
+
+def write_csv(result, output):
+    writer = csv.writer(output)
+    writer.writerow(COLUMNS)
+    writer.writerows(zip(*(result[c].tolist() for c in COLUMNS)))
+
+def to_arrow(result):
+    """Resultatet som pyarrow.Table. Kräver pyarrow, som inte är ett beroende för appen."""
+    import pyarrow
+    return pyarrow.table({c: result[c] for c in COLUMNS})
+
+def write_result(result, path):
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            sys.exit("Parquet kräver pyarrow: pip install pyarrow")
+        pyarrow.parquet.write_table(to_arrow(result), path)
+    elif path == "-":
+        write_csv(result, sys.stdout)
+    else:
+        with open(path, "w", newline = "", encoding = "utf-8") as file:
+            write_csv(result, file)
+
+def benchmark(data, repeats = 5):
+    bulk_query(data)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = bulk_query(data)
+        times.append(time.perf_counter() - start)
+    rows = len(result["ads_now"])
+    print(f"{rows} rader ({len(data.valid_occupations)} yrken x {len(default_locations(data))} orter): "
+          f"bäst {min(times) * 1000:.0f} ms, median {sorted(times)[len(times) // 2] * 1000:.0f} ms")
+    start = time.perf_counter()
+    write_csv(result, io.StringIO())
+    print(f"CSV-skrivning {(time.perf_counter() - start) * 1000:.0f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Annonser, prognos och lön för många yrken och orter.")
+    parser.add_argument("--occupations", nargs = "*", help = "Id:n för yrkesbenämningar")
+    parser.add_argument("--occupations-file", help = "Fil med ett id för yrkesbenämning per rad")
+    parser.add_argument("--locations", nargs = "*", help = "Id:n för län, kommuner eller hela Sverige")
+    parser.add_argument("--output", default = "-", help = "Fil som slutar på .csv eller .parquet, - för CSV till stdout")
+    parser.add_argument("--benchmark", action = "store_true")
+    args = parser.parse_args()
+
+    data = Datasets(snapshot = open_snapshot())
+    if args.benchmark:
+        benchmark(data)
+        return
+    occupation_ids = list(args.occupations or [])
+    if args.occupations_file:
+        with open(args.occupations_file) as file:
+            occupation_ids += [line.strip() for line in file if line.strip()]
+    try:
+        result = bulk_query(data, occupation_ids, args.locations)
+    except ValueError as error:
+        sys.exit(str(error))
+    write_result(result, args.output)
+
+if __name__ == "__main__":
+    main()
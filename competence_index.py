@@ -0,0 +1,101 @@
+import bisect
+from occupation_search import fold
+
+# Hur mycket en träff väger beroende på hur kompetensen är kopplad till yrket.
+SKILL_WEIGHTS = {"license": 3, "skill": 2, "potential_skill": 1}
+NAME_WEIGHT = 3
+
+def skill_item(skill, competence_descriptions):
+    hover_info = competence_descriptions.get(skill)
+    if not hover_info:
+        hover_info = "Ingen beskrivning tillgänglig."
+    skill_string = f"<p style='font-size:16px;'>{skill}</p>"
+    return [skill_string, hover_info]
+
+def skill_block(license, skills, generated, competence_descriptions):
+    """Kompetensbegreppen under Yrkesbeskrivning som lista av [html, hjälptext]."""
+    strings = []
+
+    if license:
+        strings.append([f"<strong>Reglerad behörigheter</strong><br />",
+                        "Behörigheter som du enligt svensk lag måste ha för att kunna utöva yrket."])
+        for l in license:
+            strings.append(skill_item(l, competence_descriptions))
+    if skills:
+        strings.append([f"<strong>Kvalitetssäkrade kompetensbegrepp</strong><br />",
+                        "Kompetensbegrepp med koppling i taxonomin till aktuell yrkesbenämning."])
+        for s in skills:
+            strings.append(skill_item(s, competence_descriptions))
+    if generated:
+        strings.append([f"<strong>Genererade kompetensbegrepp</strong><br />",
+                        "Beräknade utifrån relationer mellan taxonomin och ESCO. Kvalitén på genererade begreppen varierar."])
+        for g in generated:
+            strings.append(skill_item(g, competence_descriptions))
+
+    return strings
+
+class CompetenceIndex:
+    """Kompetensbegrepp med omvänt index över namn och beskrivningar.
+
+    skill_blocks har den färdiga listan för Yrkesbeskrivning per yrkesbenämning.
+    occupations ger för en fritextfråga de yrken som har matchande kompetenser,
+    både kvalitetssäkrade, genererade och reglerade behörigheter.
+    """
+
+    def __init__(self, competence_descriptions, occupationdata):
+        self.skill_blocks = {}
+        self.term_occupations = {}
+        for occupation_id, info in occupationdata.items():
+            skills = info["skill"] or []
+            self.skill_blocks[occupation_id] = skill_block(
+                info["license"], skills, (info["potential_skill"] or [])[0:10 - len(skills)], competence_descriptions)
+            for kind in SKILL_WEIGHTS:
+                for term in info[kind] or []:
+                    self.term_occupations.setdefault(term, []).append((occupation_id, kind))
+
+        self.terms = sorted(set(competence_descriptions) | set(self.term_occupations))
+        postings = {}
+        for position, term in enumerate(self.terms):
+            for word in fold(term).split():
+                postings.setdefault(word, {})[position] = NAME_WEIGHT
+            for word in fold(competence_descriptions.get(term, "")).split():
+                postings.setdefault(word, {}).setdefault(position, 1)
+        self.vocabulary = sorted(postings)
+        self.postings = [postings[w] for w in self.vocabulary]
+
+    def word_matches(self, word):
+        """{term-position: vikt} för alla ord i indexet som börjar med word."""
+        matches = {}
+        start = bisect.bisect_left(self.vocabulary, word)
+        for i in range(start, len(self.vocabulary)):
+            if not self.vocabulary[i].startswith(word):
+                break
+            for position, weight in self.postings[i].items():
+                if weight > matches.get(position, 0):
+                    matches[position] = weight
+        return matches
+
+    def search(self, query, limit = 20):
+        """Kompetensbegrepp där varje ord i query börjar något ord i namnet eller beskrivningen, som lista av (begrepp, poäng)."""
+        scores = None
+        for word in fold(query).split():
+            matches = self.word_matches(word)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {p: s + matches[p] for p, s in scores.items() if p in matches}
+        if not scores:
+            return []
+        ranked = sorted(scores.items(), key = lambda x: (-x[1], self.terms[x[0]]))[:limit]
+        return [(self.terms[p], s) for p, s in ranked]
+
+    def occupations(self, query, limit = 20, terms = 200):
+        """Yrken som har kompetenser som matchar query, som lista av (yrkes-id, matchade begrepp) med bäst först."""
+        scores = {}
+        matched = {}
+        for term, term_score in self.search(query, terms):
+            for occupation_id, kind in self.term_occupations.get(term, []):
+                scores[occupation_id] = scores.get(occupation_id, 0) + term_score * SKILL_WEIGHTS[kind]
+                matched.setdefault(occupation_id, []).append(term)
+        ranked = sorted(scores, key = lambda o: (-scores[o], o))[:limit]
+        return [(o, matched[o]) for o in ranked]
@@ -0,0 +1,168 @@
+import sys
+import numpy as np
+
+class ConceptIds:
+    """Internerar taxonomins koncept-id:n till täta heltal 0..n-1 i den ordning de läggs till."""
+
+    def __init__(self, ids = ()):
+        self.index = {}
+        self.ids = []
+        for concept_id in ids:
+            self.add(concept_id)
+
+    def add(self, concept_id):
+        position = self.index.get(concept_id)
+        if position is None:
+            concept_id = sys.intern(concept_id)
+            position = len(self.ids)
+            self.index[concept_id] = position
+            self.ids.append(concept_id)
+        return position
+
+    def get(self, concept_id, default = None):
+        return self.index.get(concept_id, default)
+
+    def __getitem__(self, position):
+        return self.ids[position]
+
+    def __contains__(self, concept_id):
+        return concept_id in self.index
+
+    def __len__(self):
+        return len(self.ids)
+
+SWEDEN_ID = "i46j_HmG_v64"
+
+class ConceptTable:
+    """Central id-tabell med en dimension per typ av koncept som matriserna indexeras på."""
+
+    def __init__(self, municipality_region, occupation_group_ids, barometer_ids):
+        self.occupation_groups = ConceptIds(sorted(occupation_group_ids))
+        self.municipalities = ConceptIds(sorted(municipality_region))
+        self.regions = ConceptIds(sorted(set(municipality_region.values())))
+        # Orter i matrisernas kolumnordning: kommuner, län och sist hela Sverige.
+        self.locations = ConceptIds([*self.municipalities.ids, *self.regions.ids, SWEDEN_ID])
+        self.barometers = ConceptIds(sorted(barometer_ids))
+        self.municipality_region = np.array(
+            [self.regions.get(municipality_region[m]) for m in self.municipalities.ids], dtype = np.int32)
+
+def nested_to_matrix(nested, rows, columns, dtype = np.int32, fill = 0):
+    """Fyll en matris från {rad-id: {kolumn-id: värde}}. Id:n utanför rows och columns hoppas över."""
+    row_positions = []
+    column_positions = []
+    values = []
+    for row_id, inner in nested.items():
+        row = rows.get(row_id)
+        if row is None:
+            continue
+        for column_id, value in inner.items():
+            column = columns.get(column_id)
+            if column is None:
+                continue
+            row_positions.append(row)
+            column_positions.append(column)
+            values.append(value)
+    matrix = np.full((len(rows), len(columns)), fill, dtype = dtype)
+    matrix[row_positions, column_positions] = values
+    return matrix
+
+def roll_up(municipality_counts, concepts):
+    """Lägg till kolumner för län och hela Sverige, summerade från kommunerna."""
+    membership = np.zeros((len(concepts.municipalities), len(concepts.regions)), dtype = municipality_counts.dtype)
+    membership[np.arange(len(concepts.municipalities)), concepts.municipality_region] = 1
+    regional = municipality_counts @ membership
+    national = municipality_counts.sum(axis = 1, keepdims = True, dtype = municipality_counts.dtype)
+    return np.hstack([municipality_counts, regional, national])
+
+def count_matrix(sources, groups, concepts):
+    """Annonsantal per yrkesgrupp och ort i concepts.locations ur en eller flera källor.
+
+    Läns- och riksvärden som finns i källorna används som de är, eftersom en
+    annons kan räknas en gång per län trots att den gäller flera kommuner. Övriga
+    celler summeras från kommunerna.
+    """
+    municipality_counts = sum(nested_to_matrix(s, groups, concepts.municipalities) for s in sources)
+    rolled = roll_up(municipality_counts, concepts)
+    published = np.full(rolled.shape, -1, dtype = rolled.dtype)
+    for source in sources:
+        published = np.maximum(published, nested_to_matrix(source, groups, concepts.locations, fill = -1))
+    return np.where(published >= 0, published, rolled)
+
+class AdIndex:
+    """Annonsantal nu och 2024 per yrkesgrupp och ort.
+
+    ads_now och ads_2024 har en kolumn per ort i concepts.locations. Län och
+    hela Sverige tas från källdatat där de finns och räknas annars fram genom
+    kommunernas länstillhörighet.
+    """
+
+    def __init__(self, concepts, ad_data_platsbanken, ad_data_historical, ad_data_historical_regional = None):
+        self.groups = concepts.occupation_groups
+        self.municipalities = concepts.municipalities
+        self.locations = concepts.locations
+        historical = [ad_data_historical] + ([ad_data_historical_regional] if ad_data_historical_regional else [])
+        self.ads_now = count_matrix([ad_data_platsbanken], self.groups, concepts)
+        self.ads_2024 = count_matrix(historical, self.groups, concepts)
+        # Enstaka celler läses snabbare genom en memoryview än genom numpy-indexering.
+        self.ads_now_cells = memoryview(self.ads_now)
+        self.ads_2024_cells = memoryview(self.ads_2024)
+
+    def get(self, occupation_group_id, location_id):
+        row = self.groups.get(occupation_group_id)
+        column = self.locations.get(location_id)
+        if row is None or column is None:
+            return [0, 0]
+        return [self.ads_now_cells[row, column], self.ads_2024_cells[row, column]]
+
+    def columns(self, location_ids):
+        return [c for c in (self.locations.get(l) for l in location_ids) if c is not None]
+
+    def sum(self, occupation_group_id, location_ids):
+        """Annonser nu och 2024 summerade över flera orter. Orterna bör inte överlappa, t.ex. ett län och dess kommuner."""
+        row = self.groups.get(occupation_group_id)
+        if row is None:
+            return [0, 0]
+        columns = self.columns(location_ids)
+        return [int(self.ads_now[row, columns].sum()), int(self.ads_2024[row, columns].sum())]
+
+    def top_groups(self, location_ids, n = 10, historical = False):
+        """De n yrkesgrupper med flest annonser i orterna, som lista av (yrkesgrupps-id, antal)."""
+        matrix = self.ads_2024 if historical else self.ads_now
+        totals = matrix[:, self.columns(location_ids)].sum(axis = 1)
+        n = min(n, len(totals))
+        top = np.argpartition(-totals, n - 1)[:n]
+        top = top[np.lexsort((top, -totals[top]))]
+        return [(self.groups[i], int(totals[i])) for i in top if totals[i] > 0]
+
+class ForecastIndex:
+    """Yrkesbarometerns prognoser som kodmatris barometeryrke x region.
+
+    Varje cell pekar ut ett par [jobbmöjligheter, prognos] i labels, -1 betyder att prognos saknas.
+    """
+
+    def __init__(self, concepts, forecast):
+        self.barometers = concepts.barometers
+        self.locations = concepts.locations
+        self.labels = []
+        label_codes = {}
+        coded = {}
+        for barometer_id, regional in forecast.items():
+            coded[barometer_id] = {}
+            for location_id, label in regional.items():
+                key = tuple(label)
+                if key not in label_codes:
+                    label_codes[key] = len(self.labels)
+                    self.labels.append(label)
+                coded[barometer_id][location_id] = label_codes[key]
+        self.codes = nested_to_matrix(coded, self.barometers, self.locations, dtype = np.int16, fill = -1)
+        self.code_cells = memoryview(self.codes)
+
+    def get(self, barometer_id, location_id):
+        row = self.barometers.get(barometer_id)
+        column = self.locations.get(location_id)
+        if row is None or column is None:
+            return None
+        code = self.code_cells[row, column]
+        if code < 0:
+            return None
+        return self.labels[code]
@@ -0,0 +1,229 @@
+"""Versionerade dataset som kan bytas ut medan appen kör.
+
+DatasetManager kontrollerar med jämna mellanrum om källfilerna ändrats, t.ex.
+en ny platsbanken.json eller en ny ögonblicksbild. Den nya versionen laddas i
+en bakgrundstråd och byts sedan in i ett svep, så att nya körningar får den
+medan körningar som redan pågår gör klart med sin version. En gammal version
+släpps när ingen körning längre håller den.
+
+Med version_dir får varje version en egen katalog med hårda länkar till
+källfilerna, så att en version bara läser filer som den själv pekar på. En ny
+fil som ersätter en gammal, som DatasetCache och byggskripten gör med
+os.replace, påverkar då inte versioner som redan laddats, även om de läser in
+dataset först när de efterfrågas. En fil som skrivs om på plats delar inod med
+länken, så Datasets jämför storlek och ändringstid med värdena när versionen
+skapades och vägrar läsa en sådan fil.
+"""
+import atexit
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from metrics import metrics
+
+def rss_bytes():
+    """Processens nuvarande RSS, eller högsta RSS hittills där /proc saknas."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss är i kB på Linux men i byte på macOS.
+        return peak if sys.platform == "darwin" else peak * 1024
+
+class RssSampler:
+    """Högsta RSS medan blocket kör, avläst var interval:e sekund i en tråd."""
+
+    def __init__(self, interval = 0.05):
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        self.start = self.peak = rss_bytes()
+        self.thread = threading.Thread(target = self.sample, name = "rss-sampler", daemon = True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, rss_bytes())
+        return False
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+def remove_stale_directories(version_dir):
+    """Ta bort versionskataloger som processer som inte längre kör lämnat efter sig."""
+    if not os.path.isdir(version_dir):
+        return
+    for entry in os.listdir(version_dir):
+        pid = entry.split("-", 1)[0]
+        if pid.isdigit() and int(pid) != os.getpid() and not process_alive(int(pid)):
+            shutil.rmtree(os.path.join(version_dir, entry), ignore_errors = True)
+
+def pinned_path(directory, name, path):
+    return os.path.join(directory, name + os.path.splitext(path)[1])
+
+def pin_files(files, directory):
+    """{namn: sökväg} till hårda länkar i directory, eller kopior där länkar inte går. Saknade filer behåller sin sökväg."""
+    pinned = {}
+    for name, path in files.items():
+        if not os.path.exists(path):
+            pinned[name] = path
+            continue
+        target = pinned_path(directory, name, path)
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copy2(path, target)
+        pinned[name] = target
+    return pinned
+
+class DatasetVersion:
+    def __init__(self, number, signature, data, directory = None):
+        self.number = number
+        self.signature = signature
+        self.data = data
+        self.directory = directory
+        self.references = 0
+        self.loaded = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self.resources = {}
+        self.lock = threading.Lock()
+
+    def resource(self, name, factory):
+        """Resurs som hör till just den här versionen, t.ex. förberäknade fragment. Skapas vid första anropet."""
+        with self.lock:
+            if name not in self.resources:
+                self.resources[name] = factory()
+            return self.resources[name]
+
+class DatasetManager:
+    """Håller aktiv version och de äldre versioner som fortfarande används.
+
+    load(signature, directory) bygger datat för en ny version. directory är
+    versionens egen katalog under version_dir, eller None utan version_dir.
+    signature() beskriver källorna, t.ex. ändringstid och storlek per fil, och
+    anropas högst var interval:e sekund. warm(data) förladdar det som den första
+    körningen mot en ny version annars skulle få vänta på.
+    """
+
+    def __init__(self, load, signature, interval = 30, warm = None, on_swap = None, version_dir = None):
+        self.load_version = load
+        self.signature = signature
+        self.interval = interval
+        self.warm = warm
+        self.on_swap = on_swap or []
+        self.version_dir = version_dir
+        self.lock = threading.Lock()
+        self.checking = False
+        self.last_check = time.monotonic()
+        self.versions = {}
+        self.reloads = []
+        if version_dir is not None:
+            remove_stale_directories(version_dir)
+            atexit.register(self.remove_directories)
+        signature = self.signature()
+        directory = self.new_directory()
+        self.active = self.add_version(1, signature, self.load_version(signature, directory), directory)
+
+    def new_directory(self):
+        if self.version_dir is None:
+            return None
+        os.makedirs(self.version_dir, exist_ok = True)
+        return tempfile.mkdtemp(prefix = f"{os.getpid()}-", dir = self.version_dir)
+
+    def remove_directories(self):
+        with self.lock:
+            for version in self.versions.values():
+                if version.directory:
+                    shutil.rmtree(version.directory, ignore_errors = True)
+
+    def add_version(self, number, signature, data, directory = None):
+        version = DatasetVersion(number, signature, data, directory)
+        self.versions[number] = version
+        return version
+
+    def acquire(self, number = None):
+        """Versionen med nummer number om den finns kvar, annars den aktiva, hållen tills release anropas.
+
+        Startar en kontroll av källorna vid behov.
+        """
+        with self.lock:
+            version = self.versions.get(number, self.active)
+            version.references += 1
+            if not self.checking and time.monotonic() - self.last_check >= self.interval:
+                self.checking = True
+                threading.Thread(target = self.check, name = "dataset-reload", daemon = True).start()
+        return version
+
+    def release(self, version):
+        with self.lock:
+            version.references -= 1
+            self.drop_unused()
+
+    def get(self, number = None):
+        """Versionen med nummer number om den finns kvar, annars den aktiva."""
+        with self.lock:
+            return self.versions.get(number, self.active)
+
+    def drop_unused(self):
+        for number, version in list(self.versions.items()):
+            if version is not self.active and version.references <= 0:
+                del self.versions[number]
+                if version.directory:
+                    shutil.rmtree(version.directory, ignore_errors = True)
+
+    def check(self):
+        try:
+            signature = self.signature()
+            if signature != self.active.signature:
+                self.reload(signature)
+        except Exception as error:
+            print(f"Kunde inte ladda om dataset: {error}")
+        finally:
+            with self.lock:
+                self.last_check = time.monotonic()
+                self.checking = False
+
+    def reload(self, signature):
+        # RSS avläses utifrån, så att mätningen inte gör allokeringarna i resten av processen långsammare.
+        directory = self.new_directory()
+        start = time.perf_counter()
+        try:
+            with RssSampler() as rss:
+                data = self.load_version(signature, directory)
+                if self.warm:
+                    self.warm(data)
+        except Exception:
+            if directory:
+                shutil.rmtree(directory, ignore_errors = True)
+            raise
+        seconds = time.perf_counter() - start
+        peak = rss.peak - rss.start
+
+        with self.lock:
+            version = self.add_version(self.active.number + 1, signature, data, directory)
+            self.reloads.append({"version": version.number, "seconds": round(seconds, 2), "peak_rss_growth_bytes": peak, "loaded": version.loaded})
+            self.active = version
+            self.drop_unused()
+        for callback in self.on_swap:
+            callback()
+        metrics.set_gauge("dataset_version", {}, version.number)
+        metrics.set_gauge("dataset_reload_seconds", {}, round(seconds, 2))
+        metrics.set_gauge("dataset_reload_peak_rss_growth_bytes", {}, peak)
+        print(f"Dataset version {version.number} laddad på {seconds:.1f} s, RSS växte som mest {peak / 1e6:.0f} MB under laddningen")
+        return version
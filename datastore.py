@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from competence_index import CompetenceIndex
+from concept_index import AdIndex, ConceptTable, ForecastIndex
+from education_index import EducationIndex
+from metrics import metrics, timed
+from locality_index import CommuteAdIndex, LocalityIndex
+from occupation_search import OccupationSearch
+
+DATASET_FILES = {
+    "occupationdata": "all_valid_occupations_with_info_v25.json",
+    "valid_occupations": "valid_occupations.json",
+    "valid_occupations_no_educational_req": "valid_occupations_no_educational_req.json",
+    "adwords": "all_wordclouds_v25.json",
+    "ad_data_historical": "ssyk_kommun_annonser_2024.json",
+    "ad_data_historical_regional": "ssyk_id_region_annonser_2024.json",
+    "ad_data_platsbanken": "platsbanken.json",
+    "competence_descriptions": "kompetens_beskrivning.json",
+    "labour_flow": "labour_flow_data.json",
+    "forecast": "barometer_regional.json",
+    "ssyk_salary": "ssyk_salary.json",
+    "ssyk_utbildningar": "utbildningsdata.json",
+    "regions": "region_name_id.json",
+    "locations_id": "ort_namn_id.json",
+    "geodata": "ort_ort_relevans.json",
+    "municipality_id_namn": "kommun_id_namn.json",
+    "municipality_region": "kommun_region.json",
+    "occupation_id_dk_preflabel": "occupation_id_dk_preflabel.json",
+    "occupation_id_no_preflabel": "occupation_id_no_preflabel.json"}
+
+@timed()
+def import_data(filename):
+    with open(filename) as file:
+        content = file.read()
+    output = json.loads(content)
+    return output
+
+@timed()
+def load_dataset(name, filename, snapshot = None):
+    if snapshot:
+        output = snapshot.load(name, filename)
+        if output is not None:
+            return output
+    # Utan aktuell ögonblicksbild läses JSON-filen, vilket räknas som cachemiss.
+    metrics.miss("load_dataset")
+    return import_data(filename)
+
+def concept_indexes(data):
+    """Id-tabellen, annonsmatriserna och prognosmatrisen byggs tillsammans så att varje källfil bara avkodas en gång."""
+    platsbanken = data.read("ad_data_platsbanken")
+    historical = data.read("ad_data_historical")
+    historical_regional = data.read("ad_data_historical_regional")
+    forecast = data.read("forecast")
+    concepts = ConceptTable(data.municipality_region, set(platsbanken) | set(historical) | set(historical_regional), forecast)
+    return {
+        "concepts": concepts,
+        "ad_index": AdIndex(concepts, platsbanken, historical, historical_regional),
+        "forecast_index": ForecastIndex(concepts, forecast)}
+
+def wordcloud_fingerprint(words):
+    """Fingeravtryck av orden ett ordmoln ritas från. Ingår i filnamnet för den förrenderade bilden."""
+    text = json.dumps(words, sort_keys = True, ensure_ascii = False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+DERIVED_DATASETS = {
+    "valid_locations": lambda data: list(data.locations_id.keys()),
+    "labour_flow_sets": lambda data: {ssyk: frozenset(flow) for ssyk, flow in data.read("labour_flow").items()},
+    "concept_indexes": lambda data: concept_indexes(data),
+    "concepts": lambda data: data.concept_indexes["concepts"],
+    "ad_index": lambda data: data.concept_indexes["ad_index"],
+    "forecast_index": lambda data: data.concept_indexes["forecast_index"],
+    "locality_index": lambda data: LocalityIndex(data.read("geodata"), data.municipality_id_namn),
+    "commute_ad_index": lambda data: CommuteAdIndex(data.locality_index, data.ad_index),
+    "education_index": lambda data: EducationIndex(data.read("ssyk_utbildningar"), data.locality_index),
+    "occupation_search": lambda data: OccupationSearch(
+        data.valid_occupations, data.occupationdata,
+        data.occupation_id_dk_preflabel, data.occupation_id_no_preflabel),
+    "competence_index": lambda data: CompetenceIndex(data.read("competence_descriptions"), data.occupationdata),
+    # Räknas en gång per version så att ordmolnen inte hashas om vid varje visning.
+    "wordcloud_fingerprints": lambda data: {k: wordcloud_fingerprint(v) for k, v in data.adwords.items() if v}}
+
+class Datasets:
+    """Alla dataset som appen läser. En instans delas av alla sessioner och får inte ändras.
+
+    Varje dataset laddas först när det efterfrågas som attribut. touched visar
+    vilka dataset som laddats och hur många millisekunder det tog.
+
+    signatures är [storlek, ändringstid] per källfil när instansen skapades.
+    Har en fil skrivits om på plats sedan dess ger läsningen RuntimeError i
+    stället för att blanda in nytt innehåll. Nya filer ska ersätta de gamla
+    med os.replace.
+    """
+
+    def __init__(self, files = DATASET_FILES, snapshot = None, signatures = None):
+        self.files = files
+        self.snapshot = snapshot
+        self.signatures = signatures or {}
+        self.touched = {}
+        self.lock = threading.RLock()
+
+    def source(self, name):
+        path = self.files[name]
+        expected = self.signatures.get(name)
+        if expected is not None and os.path.exists(path):
+            status = os.stat(path)
+            if [status.st_size, status.st_mtime_ns] != expected:
+                raise RuntimeError(f"{path} har skrivits om på plats efter att datasetversionen skapades. Ersätt filen med os.replace.")
+        return path
+
+    def read(self, name):
+        """Läs ett källdataset utan att behålla det, för index som ersätter råformatet."""
+        if name in self.__dict__:
+            return self.__dict__[name]
+        return load_dataset(name, self.source(name), self.snapshot)
+
+    def __getattr__(self, name):
+        # Anropas bara när attributet inte redan finns, dvs. innan datasetet laddats.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self.files:
+            loader = lambda: load_dataset(name, self.source(name), self.snapshot)
+        elif name in DERIVED_DATASETS:
+            loader = lambda: DERIVED_DATASETS[name](self)
+        else:
+            raise AttributeError(f"Okänt dataset: {name}")
+        with self.lock:
+            if name not in self.__dict__:
+                start = time.perf_counter()
+                output = loader()
+                self.touched[name] = round((time.perf_counter() - start) * 1000, 1)
+                metrics.set_gauge("dataset_load_milliseconds", {"dataset": name}, self.touched[name])
+                self.__dict__[name] = output
+        return self.__dict__[name]
@@ -0,0 +1,53 @@
+def town_key(town):
+    """Ortnamn i samma form som ortdelen av tätorternas id, t.ex. 'Västra Frölunda' -> 'västra_frölunda'."""
+    return "_".join(town.lower().split())
+
+class EducationIndex:
+    """Utbildningar ur utbildningsdata.json indexerade på (SSYK, utbildningstyp, ort).
+
+    by_ssyk ger utbildningarna grupperade per typ i den ordning fliken Utbildning
+    visar dem. near ordnar utbildningarna efter avstånd från en tätort via
+    tätortens pendlingsområde. Utbildningsorter som inte är tätorter i geodatan,
+    t.ex. stadsdelar i Stockholm, finns med i by_ssyk men kan inte hittas via near.
+    """
+
+    def __init__(self, utbildningsdata, localities):
+        self.entries = {}
+        self.by_ssyk = {}
+        for ssyk, utbildningar in utbildningsdata.items():
+            types = {}
+            for u in utbildningar:
+                types.setdefault(u["utbildningstyp"], []).append(u)
+                self.entries.setdefault((ssyk, u["utbildningstyp"], town_key(u["ort"])), []).append(u)
+            self.by_ssyk[ssyk] = dict(sorted(types.items()))
+        self.localities = localities
+
+    def types(self, ssyk):
+        return list(self.by_ssyk.get(ssyk, {}))
+
+    def get(self, ssyk, utbildningstyp, town):
+        return self.entries.get((ssyk, utbildningstyp, town_key(town)), [])
+
+    def commute_area(self, locality_id):
+        """Ortdelen av id:t för tätorten och dess grannar med avstånd, sorterat på avstånd."""
+        localities = self.localities
+        position = localities.localities.get(locality_id)
+        start, end = localities.ranked_offsets[position], localities.ranked_offsets[position + 1]
+        towns = {}
+        for neighbour, distance in zip(
+                [position, *localities.ranked_neighbours[start:end].tolist()],
+                [0, *localities.ranked_distances[start:end].tolist()]):
+            towns.setdefault(localities.localities[neighbour].split(";")[0], distance)
+        return sorted(towns.items(), key = lambda x: x[1])
+
+    def near(self, ssyk, locality_id):
+        """Utbildningar i tätortens pendlingsområde per typ, som listor av (utbildning, avstånd) sorterade på avstånd."""
+        if locality_id not in self.localities.localities:
+            return {}
+        area = self.commute_area(locality_id)
+        found = {}
+        for utbildningstyp in self.types(ssyk):
+            for town, distance in area:
+                for u in self.entries.get((ssyk, utbildningstyp, town), []):
+                    found.setdefault(utbildningstyp, []).append((u, distance))
+        return found
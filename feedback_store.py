@@ -0,0 +1,223 @@
+"""Återkoppling som bara läggs till, i stället för att feedback.json skrivs om vid varje inskick.
+
+Varje inskick läggs i en kö och en bakgrundstråd skriver kön i omgångar som
+nya NDJSON-objekt under feedback/. Inget befintligt objekt skrivs om, så två
+samtidiga inskick kan inte skriva över varandra och tiden för ett inskick
+växer inte med mängden återkoppling. Innan en post köas läggs den till i en
+lokal buffertfil, som töms när posten skrivits till backend. Poster som inte
+hann skrivas innan processen avslutades läses in från bufferten och skrivs vid
+nästa start. Objekten slås ihop till feedback.json med:
+
+    python feedback_store.py compact
+    python feedback_store.py compact --backend feedback_lokal
+"""
+import argparse
+import atexit
+import contextlib
+import fcntl
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from backends import open_backend
+
+BUCKET = "androjons_bucket"
+FEEDBACK_FILE = "feedback.json"
+ENTRY_PREFIX = "feedback/"
+BUFFER_FILE = "feedback_buffer.ndjson"
+
+def to_ndjson(entries):
+    return "".join(json.dumps(e, ensure_ascii = False) + "\n" for e in entries).encode("utf-8")
+
+def from_ndjson(data):
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+
+def read_buffer_file(path):
+    """Posterna i en lokal buffertfil. En rad som avbröts mitt i skrivningen hoppas över."""
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in data.decode("utf-8", "replace").splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            pass
+    return entries
+
+@contextlib.contextmanager
+def locked_buffer(path):
+    """Exklusivt lås på bufferten, så att processer som delar katalog inte skriver över varandras poster."""
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+class FeedbackStore:
+    """Köar återkoppling och skriver den i omgångar till backend.
+
+    submit returnerar direkt. Bakgrundstråden skriver när batch_size poster
+    väntar eller flush_interval sekunder gått sedan den första. Misslyckas en
+    skrivning läggs posterna tillbaka och skrivs nästa gång.
+
+    Med buffer_path läggs varje post först till i den lokala filen, och de
+    poster som skrivits till backend tas bort ur filen efteråt. Poster som
+    ligger kvar i filen när en ny FeedbackStore skapas köas igen. Dör processen
+    mellan skrivningen och rensningen skrivs posterna två gånger, men
+    sammanslagningen tar bara med varje id en gång.
+    """
+
+    def __init__(self, backend, batch_size = 20, flush_interval = 2.0, buffer_path = None):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer_path = buffer_path
+        self.pending = queue.Queue()
+        self.in_flight = []
+        self.write_lock = threading.Lock()
+        self.buffer_lock = threading.Lock()
+        self.worker = None
+        self.worker_lock = threading.Lock()
+        atexit.register(self.flush)
+        recovered = self.read_buffer()
+        if recovered:
+            for entry in recovered:
+                self.pending.put(entry)
+            self.start_worker()
+
+    def submit(self, entry):
+        """Lägg en post i bufferten och kön. Posten får ett id så att sammanslagningen kan känna igen dubbletter."""
+        entry = {"id": uuid.uuid4().hex, **entry}
+        if self.buffer_path:
+            with self.buffer_lock, locked_buffer(self.buffer_path), open(self.buffer_path, "ab") as file:
+                file.write(to_ndjson([entry]))
+                file.flush()
+                os.fsync(file.fileno())
+        self.pending.put(entry)
+        self.start_worker()
+        return entry["id"]
+
+    def read_buffer(self):
+        if not self.buffer_path:
+            return []
+        with self.buffer_lock, locked_buffer(self.buffer_path):
+            return read_buffer_file(self.buffer_path)
+
+    def release_buffer(self, batch):
+        """Ta bort de skrivna posterna ur bufferten och töm den när inget annat väntar."""
+        if not self.buffer_path:
+            return
+        written = {entry["id"] for entry in batch}
+        with self.buffer_lock, locked_buffer(self.buffer_path):
+            remaining = [e for e in read_buffer_file(self.buffer_path) if e.get("id") not in written]
+            descriptor, temporary = tempfile.mkstemp(
+                prefix = f"{os.path.basename(self.buffer_path)}.", suffix = ".tmp",
+                dir = os.path.dirname(os.path.abspath(self.buffer_path)))
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(to_ndjson(remaining))
+            os.replace(temporary, self.buffer_path)
+
+    def start_worker(self):
+        with self.worker_lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target = self.run, name = "feedback-writer", daemon = True)
+                self.worker.start()
+
+    def run(self):
+        while True:
+            batch = self.in_flight = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout = remaining))
+                except queue.Empty:
+                    break
+            self.write_batch(batch)
+            self.in_flight = []
+
+    def write_batch(self, batch):
+        name = f"{ENTRY_PREFIX}{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.ndjson"
+        try:
+            with self.write_lock:
+                self.backend.write(name, to_ndjson(batch), "application/x-ndjson; charset=utf-8")
+        except Exception as error:
+            print(f"Kunde inte spara {len(batch)} återkopplingar, försöker igen: {error}")
+            for entry in batch:
+                self.pending.put(entry)
+            time.sleep(self.flush_interval)
+            return
+        self.release_buffer(batch)
+
+    def flush(self):
+        """Skriv allt som väntar i kön direkt, t.ex. innan processen avslutas.
+
+        En omgång som bakgrundstråden håller på med skrivs också. Den kan då
+        hamna i två objekt, men sammanslagningen tar bara med varje id en gång.
+        """
+        batch = list(self.in_flight)
+        while True:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.write_batch(batch)
+
+    def entries(self):
+        """All återkoppling: den sammanslagna feedback.json följd av poster som inte slagits ihop än."""
+        compacted = self.backend.read(FEEDBACK_FILE)
+        entries = json.loads(compacted) if compacted else []
+        for name in self.backend.list(ENTRY_PREFIX):
+            data = self.backend.read(name)
+            if data:
+                entries.extend(from_ndjson(data))
+        return entries
+
+def compact(backend):
+    """Slå ihop NDJSON-objekten med feedback.json och ta bort de objekt som kom med.
+
+    Objekt som skrivs medan sammanslagningen pågår finns inte i listan och
+    ligger kvar till nästa körning. Poster med samma id tas bara med en gång,
+    så en avbruten körning kan göras om.
+    """
+    names = backend.list(ENTRY_PREFIX)
+    compacted = backend.read(FEEDBACK_FILE)
+    entries = json.loads(compacted) if compacted else []
+    seen = {e["id"] for e in entries if "id" in e}
+    added = 0
+    for name in names:
+        for entry in from_ndjson(backend.read(name) or b""):
+            if entry.get("id") not in seen:
+                entries.append(entry)
+                seen.add(entry.get("id"))
+                added += 1
+    if names:
+        json_string = json.dumps(entries, indent = 2, ensure_ascii = False)
+        backend.write(FEEDBACK_FILE, json_string.encode("utf-8"), "application/json; charset=utf-8")
+        for name in names:
+            backend.delete(name)
+    return added, len(names)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Slå ihop återkopplingen till feedback.json.")
+    parser.add_argument("command", choices = ["compact"])
+    parser.add_argument("--backend", default = f"gs://{BUCKET}", help = "gs://bucket, en katalog eller memory://")
+    args = parser.parse_args()
+
+    backend = open_backend(args.backend)
+    start = time.perf_counter()
+    added, objects = compact(backend)
+    print(f"Slog ihop {added} poster från {objects} objekt till {FEEDBACK_FILE} på {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,108 @@
 import streamlit as st
+import contextlib
+import functools
+import io
+import os
 import re
-import json
 import math
 import requests
-from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib_venn import venn2
-from wordcloud import WordCloud
 import datetime
-from google.cloud import storage
 from google.oauth2 import service_account
-
-@st.cache_data
-def import_data(filename):
-    with open(filename) as file:
-        content = file.read()
-    output = json.loads(content)
-    return output
+from backends import DatasetCache, GCSBackend, open_backend
+from datastore import DATASET_FILES, DERIVED_DATASETS, Datasets
+from dataset_manager import DatasetManager, pin_files, pinned_path
+from snapshot import SNAPSHOT_FILE, file_signature, open_snapshot
+from precompute import FRAGMENT_FILE, open_fragment_store
+from wordclouds import render_wordcloud, wordcloud_path
+from metrics import measure, metrics, state_size, timed
+import queries
+from feedback_store import BUCKET, BUFFER_FILE, FeedbackStore
+
+def fetch_dataset_files():
+    # YRKESINFO_DATA pekar ut en bucket eller katalog att hämta datasetfilerna från,
+    # t.ex. gs://androjons_bucket/data. Ögonblicksbilden hör till filerna i repot och används inte då.
+    data_address = os.environ.get("YRKESINFO_DATA")
+    if data_address:
+        credentials = get_credentials() if data_address.startswith("gs://") else None
+        return DatasetCache(open_backend(data_address, credentials)).fetch_all(DATASET_FILES)
+    return DATASET_FILES
+
+def dataset_signature():
+    files = fetch_dataset_files()
+    sources = [*sorted(files.items())]
+    if not os.environ.get("YRKESINFO_DATA"):
+        sources += [("snapshot", SNAPSHOT_FILE), ("fragments", FRAGMENT_FILE)]
+    return tuple((name, path, tuple(file_signature(path)) if os.path.exists(path) else None) for name, path in sources)
+
+def load_dataset_version(signature, directory):
+    # Versionen läser bara sina egna länkar till filerna, så att nya filer inte blandas in i en version som redan kör.
+    files = pin_files({name: path for name, path, _ in signature}, directory)
+    snapshot = None if os.environ.get("YRKESINFO_DATA") else open_snapshot(files["snapshot"])
+    dataset_files = {name: files[name] for name in DATASET_FILES}
+    signatures = {name: file_signature(path) for name, path in dataset_files.items() if os.path.exists(path)}
+    return Datasets(files = dataset_files, snapshot = snapshot, signatures = signatures)
+
+def warm_datasets(data):
+    for name in DERIVED_DATASETS:
+        getattr(data, name)
+
+@st.cache_resource
+def get_dataset_manager():
+    return DatasetManager(
+        load_dataset_version, dataset_signature,
+        interval = float(os.environ.get("YRKESINFO_RELOAD_INTERVAL", 30)),
+        warm = warm_datasets,
+        on_swap = [f.__wrapped__.clear for f in (create_venn, create_similar_occupations, render_wordcloud_live)],
+        version_dir = "dataset_versions")
+
+def get_dataset_version():
+    """Versionen som körningen låste i main, eller den aktiva för körningar utanför main."""
+    return get_dataset_manager().get(st.session_state.get("dataset_version"))
+
+@contextlib.contextmanager
+def hold_dataset_version(number = None):
+    """Håller versionen number, eller den aktiva, medan blocket kör och låser sessionen till den.
+
+    Har versionen redan släppts byts sessionen till den aktiva.
+    """
+    manager = get_dataset_manager()
+    version = manager.acquire(number)
+    st.session_state.dataset_version = version.number
+    try:
+        yield version
+    finally:
+        manager.release(version)
+
+def dataset_fragment(function):
+    """st.fragment som håller sessionens datasetversion även när bara fragmentet körs om."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with hold_dataset_version(st.session_state.get("dataset_version")):
+            return function(*args, **kwargs)
+    return st.fragment(wrapper)
+
+def get_datasets():
+    return get_dataset_version().data
+
+def get_fragment_store():
+    version = get_dataset_version()
+    filename = pinned_path(version.directory, "fragments", FRAGMENT_FILE) if version.directory else FRAGMENT_FILE
+    if not os.path.exists(filename):
+        filename = FRAGMENT_FILE
+    return version.resource("fragments", lambda: open_fragment_store(version.data.files, filename))
+
+def get_page_fragment(id_occupation, region_id):
+    store = get_fragment_store()
+    if store:
+        return store.get(id_occupation, region_id)
+    return None
+
+@st.cache_resource
+def get_credentials():
+    credentials_dict = st.secrets["gcp_service_account"]
+    return service_account.Credentials.from_service_account_info(credentials_dict)
 
 def show_initial_information():
     st.logo("af-logotyp-rgb-540px.jpg")
@@ -23,75 +110,23 @@ def show_initial_information():
     initial_text = "Ett försöka att erbjuda information/stöd för arbetsförmedlare när det kommer till att välja <em>rätt</em> yrke och underlätta relaterade informerade bedömningar och beslut när det kommer till GYR-Y (Geografisk och yrkesmässig rörlighet - Yrke). Informationen är taxonomi-, statistik- och annonsdriven. 1180 yrkesbenämningar bedöms ha tillräckligt annonsunderlag för pålitliga beräkningar. Resterande yrkesbenämningar kompletteras med beräkningar på yrkesgruppsnivå."
     st.markdown(f"<p style='font-size:12px;'>{initial_text}</p>", unsafe_allow_html=True)
 
+@timed()
 def initiate_session_state():
-    if "occupationdata" not in st.session_state:
-        st.session_state.occupationdata = import_data("all_valid_occupations_with_info_v25.json")
-    if "valid_occupations" not in st.session_state:
-        st.session_state.valid_occupations = import_data("valid_occupations.json")
-    if "valid_occupations_no_educational_req" not in st.session_state:
-        st.session_state.valid_occupations_no_educational_req = import_data("valid_occupations_no_educational_req.json")
-    if "adwords" not in st.session_state:
-        st.session_state.adwords = import_data("all_wordclouds_v25.json")
-    if "ad_data_historical" not in st.session_state:
-        st.session_state.ad_data_historical = import_data("ssyk_region_kommun_annonser_2024.json")
-    if "ad_data_platsbanken" not in st.session_state:
-        st.session_state.ad_data_platsbanken = import_data("platsbanken.json")
-    if "competence_descriptions" not in st.session_state:
-        st.session_state.competence_descriptions = import_data("kompetens_beskrivning.json")
-    if "labour_flow" not in st.session_state:
-        st.session_state.labour_flow = import_data("labour_flow_data.json")
-    if "forecast" not in st.session_state:
-        st.session_state.forecast = import_data("barometer_regional.json")
-    if "ssyk_salary" not in st.session_state:
-        st.session_state.ssyk_salary = import_data("ssyk_salary.json")
-    if "ssyk_utbildningar" not in st.session_state:
-        st.session_state.ssyk_utbildningar = import_data("utbildningsdata.json")
-    if "regions" not in st.session_state:
-        st.session_state.regions = import_data("region_name_id.json")
-    if "locations_id" not in st.session_state:
-        st.session_state.locations_id = import_data("ort_namn_id.json")
-    if "geodata" not in st.session_state:
-        st.session_state.geodata = import_data("ort_ort_relevans.json")
-    if "municipality_id_namn" not in st.session_state:
-        st.session_state.municipality_id_namn = import_data("kommun_id_namn.json")
-    if "occupation_id_dk_preflabel" not in st.session_state:
-        st.session_state.occupation_id_dk_preflabel = import_data("occupation_id_dk_preflabel.json")
-    if "occupation_id_no_preflabel" not in st.session_state:
-        st.session_state.occupation_id_no_preflabel = import_data("occupation_id_no_preflabel.json")   
-    if "adwords_occupation" not in st.session_state:
-        st.session_state.adwords_occupation = {}
-    if "credentials" not in st.session_state:
-        credentials_dict = st.secrets["gcp_service_account"]
-        st.session_state.credentials = service_account.Credentials.from_service_account_info(credentials_dict)
-    if "valid_occupation_names" not in st.session_state:
-        st.session_state.valid_occupation_names = sorted(list(st.session_state.valid_occupations.keys()))
-    if "valid_occupations_names_no_educational_req" not in st.session_state:
-        st.session_state.valid_occupations_names_no_educational_req = sorted(list(st.session_state.valid_occupations_no_educational_req.keys()))
-    if "valid_locations" not in st.session_state:
-        st.session_state.valid_locations = list(st.session_state.locations_id.keys())
     if "selected_region" not in st.session_state:
         st.session_state.selected_region = ""
 
-def load_feedback():
-    """Ladda befintlig feedback från GCS."""
-    storage_client = storage.Client(credentials = st.session_state.credentials, project = st.session_state.credentials.project_id)
-    bucket = storage_client.bucket("androjons_bucket")
-    blob = bucket.blob("feedback.json")
+@st.cache_resource
+def get_feedback_store():
+    feedback_address = os.environ.get("YRKESINFO_FEEDBACK")
+    if feedback_address:
+        credentials = get_credentials() if feedback_address.startswith("gs://") else None
+        return FeedbackStore(open_backend(feedback_address, credentials), buffer_path = BUFFER_FILE)
+    return FeedbackStore(GCSBackend(BUCKET, get_credentials()), buffer_path = BUFFER_FILE)
 
-    if blob.exists():
-        data = blob.download_as_text()
-        return json.loads(data)
-    else:
-        return []
-
-def save_feedback(feedback_data):
-    """Spara feedback till GCS."""
-    storage_client = storage.Client(credentials = st.session_state.credentials, project = st.session_state.credentials.project_id)
-    bucket = storage_client.bucket("androjons_bucket")
-    blob = bucket.blob("feedback.json")
-    json_string = json.dumps(feedback_data, indent = 2, ensure_ascii = False)
-    json_bytes = json_string.encode("utf-8")
-    blob.upload_from_string(json_bytes, content_type = "application/json; charset=utf-8")
+@timed()
+def save_feedback(new_entry):
+    """Köa återkopplingen. Den skrivs i bakgrunden."""
+    get_feedback_store().submit(new_entry)
 
 @st.dialog("Återkoppling")
 def dialog_(selected_occupation, tab_name, questions, selected_location = None):
@@ -101,7 +136,6 @@ def dialog_(selected_occupation, tab_name, questions, selected_location = None):
         answers[q] = st.text_area(label = q, key = f"{q}")
 
     if st.button("Spara återkoppling", key=f"{tab_name}_save_button"):
-        feedback = load_feedback()
         new_entry = {
             "tid": datetime.datetime.now().isoformat(),
             "selected_occupation": selected_occupation,
@@ -113,8 +147,7 @@ def dialog_(selected_occupation, tab_name, questions, selected_location = None):
             new_entry["stars"] = stars
         if selected_location is not None:
             new_entry["selected_location"] = selected_location
-        feedback.append(new_entry)
-        save_feedback(feedback)
+        save_feedback(new_entry)
         st.session_state[f"{tab_name}_feedback_saved"] = True
         st.rerun()
 
@@ -168,75 +201,11 @@ def create_tree(field, group, occupation, barometer, bold, yrkessamling = None,
     return tree
     
 def create_regional_link(id_group, id_region = None):
-    if id_region == "i46j_HmG_v64":
-        id_region = None
-    link = f"https://arbetsformedlingen.se/platsbanken/annonser?p=5:{id_group}&q="
-    if id_region:
-        region = "&l=2:" + id_region
-        return link + region
-    else:
-        return link
-
-def split_town_municipality(town_municipality):
-    town_municipality_split = town_municipality.split(";")
-    municipality_id = town_municipality_split[1]
-    municipality_name = st.session_state.municipality_id_namn.get(municipality_id)
-    town_split = town_municipality_split[0]
-    city_name = ' '.join(re.split("_", town_split))
-    town_with_municipality = f"{city_name.capitalize()} ({municipality_name.capitalize()})"
-    return town_with_municipality, f"{municipality_name} kommun"
+    return queries.platsbanken_link(id_group, id_region)
 
+@timed()
 def create_list_locations(id_location):
-    list_relevant_locations = st.session_state.geodata.get(id_location)
-    selected_town_with_municipality, municipality_name = split_town_municipality(id_location)
-
-    all_locations = [{
-        "town_with_municipality": selected_town_with_municipality,
-        "municipality": municipality_name,
-        "distance": 0,
-        "relevance": "hög"}]
-    
-    order = {"hög": 0, "medel": 1, "låg": 2}
-    sorted_relevant_locations = sorted(list_relevant_locations, key = lambda x: (order.get(x["relevans"], 3), x["avstånd"]))
-
-    for l in sorted_relevant_locations:
-        town_with_municipality, municipality_name = split_town_municipality(l["ort2_id"])
-
-        relevant_location = {
-        "town_with_municipality": town_with_municipality,
-        "municipality": municipality_name,
-        "distance": l["avstånd"],
-        "relevance": l["relevans"]}
-        all_locations.append(relevant_location)
-    return all_locations
-
-def add_hoover_to_string(skill):
-    hover_info = st.session_state.competence_descriptions.get(skill)
-    if not hover_info:
-        hover_info = "Ingen beskrivning tillgänglig."
-    skill_string = f"<p style='font-size:16px;'>{skill}</p>"
-    return [skill_string, hover_info]
-    
-def create_skill_string(license, skills, generated):
-    strings = []
-
-    if license:
-        strings.append([f"<strong>Reglerad behörigheter</strong><br />",
-                        "Behörigheter som du enligt svensk lag måste ha för att kunna utöva yrket."])
-        for l in license:
-            strings.append(add_hoover_to_string(l))
-    if skills:
-        strings.append([f"<strong>Kvalitetssäkrade kompetensbegrepp</strong><br />",
-                        "Kompetensbegrepp med koppling i taxonomin till aktuell yrkesbenämning."])
-        for s in skills:
-            strings.append(add_hoover_to_string(s))
-    if generated:
-        strings.append([f"<strong>Genererade kompetensbegrepp</strong><br />",
-                        "Beräknade utifrån relationer mellan taxonomin och ESCO. Kvalitén på genererade begreppen varierar."])
-        for g in generated:
-            strings.append(add_hoover_to_string(g))
-
-    return strings
+    return queries.list_locations(get_datasets(), id_location)
 
 def create_string_educational_background(educations):
     strings = []
@@ -246,9 +215,9 @@ def create_string_educational_background(educations):
     skill_string = f"<p style='font-size:16px;'>{string}</p>"
     return skill_string
 
-def create_educational_string(data):
+def create_educational_string(data, distances = None):
     strings = []
-    for s in data:
+    for i, s in enumerate(data):
         if not "beskrivning" in s:
             beskrivning = "Ingen utbildningsbeskrivning tillgänglig."
         else:
@@ -256,6 +225,8 @@ def create_educational_string(data):
         url = s["url"]
         educational_name = s["utbildningsnamn"]
         city = s["ort"]
+        if distances:
+            city = f"{city} ({distances[i]} km)"
         link = f"<a href='{url}'>{educational_name}</a>"
         hover_info = beskrivning
         string = f"{city} - {link}"
@@ -277,7 +248,7 @@ def create_string_location(data):
         hover_string = "Låg relevans: Små orter med svagare möjligheter till jobb"
     return location_string, hover_string
 
-def create_venn_data(a_name, a_words, b_name, b_words, degree_of_overlap):
+def create_venn_overlap(a_words, b_words, degree_of_overlap):
     if degree_of_overlap == 1:
         common_max = 14
         only_in_max = 8
@@ -287,57 +258,78 @@ def create_venn_data(a_name, a_words, b_name, b_words, degree_of_overlap):
     elif degree_of_overlap == 0:
         common_max = 6
         only_in_max = 12
-    output = {}
     common = [x for x in a_words if x in b_words]
-    a = common[0:common_max]
-    b = common[0:common_max]
     only_in_a = [x for x in a_words if x not in b_words]
-    a.extend(only_in_a[0:only_in_max])
     only_in_b = [x for x in b_words if x not in a_words]
-    b.extend(only_in_b[0:only_in_max])
-    output[a_name] = a
-    output[b_name] = b
-    return output
+    return [common[0:common_max], only_in_a[0:only_in_max], only_in_b[0:only_in_max]]
 
-def create_venn(name_choosen, name_similar, adwords_similar, degree_of_overlap):
-    venn_data = create_venn_data(name_choosen, st.session_state.adwords_occupation, name_similar, adwords_similar, degree_of_overlap)
+def create_venn_data(a_name, b_name, overlap):
+    common, only_in_a, only_in_b = overlap
+    output = {}
+    output[a_name] = common + only_in_a
+    output[b_name] = common + only_in_b
+    return output
 
+def get_venn_overlap(id_occupation, id_similar, degree_of_overlap):
+    store = get_fragment_store()
+    if store:
+        overlap = store.get_venn(id_occupation, id_similar, degree_of_overlap)
+        if overlap:
+            return overlap
+    data = get_datasets()
+    info = data.occupationdata.get(id_occupation)
+    adwords_choosen = data.adwords.get(info["wordcloud_id"]) or {}
+    adwords_similar = data.adwords.get(id_similar) or {}
+    return create_venn_overlap(adwords_choosen, adwords_similar, degree_of_overlap)
+
+@timed("create_venn")
+@st.cache_data(max_entries = 256, show_spinner = False)
+def create_venn(id_occupation, id_similar, degree_of_overlap, data_version = None):
+    metrics.miss("create_venn")
+    data = get_datasets()
+    name_choosen = data.occupationdata.get(id_occupation)["preferred_label"]
+    name_similar = data.occupationdata.get(id_similar)["preferred_label"]
+    overlap = get_venn_overlap(id_occupation, id_similar, degree_of_overlap)
+    return render_venn(create_venn_data(name_choosen, name_similar, overlap))
+
+def render_venn(venn_data):
+    """Venndiagram som PNG för {namn: ord} med två yrken. Trådsäker, rör inte pyplot."""
     titles = []
     words = []
     for k, v in venn_data.items():
         titles.append(k)
         words.append(set(v))
-    plt.figure(figsize= (12, 8))
-    venn = venn2(subsets = words, set_labels = titles, set_colors = ["skyblue", "lightgreen"])
-    venn.get_label_by_id("10").set_text("\n".join(words[0] - words[1]))
-    venn.get_label_by_id("11").set_text("\n".join(words[0] & words[1]))
-    venn.get_label_by_id("01").set_text("\n".join(words[1] - words[0]))
-    return plt
-
-@st.cache_data
-def create_wordcloud(words):
-    wordcloud = WordCloud(width = 800, height = 800,
-                          background_color = 'white',
-                          prefer_horizontal = 1).generate_from_frequencies(words)
-    plt.figure(figsize = (6, 6), facecolor = None)
-    plt.imshow(wordcloud)
-    plt.axis('off')
-    plt.tight_layout(pad = 0)
-    st.pyplot(plt)
+    # Figure används direkt i stället för pyplot, som delar global figurstatus mellan sessionernas trådar.
+    figure = Figure(figsize = (12, 8))
+    venn = venn2(subsets = words, set_labels = titles, set_colors = ["skyblue", "lightgreen"], ax = figure.subplots())
+    regions = {"10": words[0] - words[1], "11": words[0] & words[1], "01": words[1] - words[0]}
+    for label_id, label_words in regions.items():
+        # Tomma delmängder saknar etikett.
+        label = venn.get_label_by_id(label_id)
+        if label:
+            label.set_text("\n".join(label_words))
+    image = io.BytesIO()
+    figure.savefig(image, format = "png", dpi = 200, bbox_inches = "tight")
+    return image.getvalue()
+
+@timed("render_wordcloud_live")
+@st.cache_data(max_entries = 64, show_spinner = False)
+def render_wordcloud_live(wordcloud_id, data_version = None):
+    metrics.miss("render_wordcloud_live")
+    return render_wordcloud(get_datasets().adwords.get(wordcloud_id))
+
+@timed()
+def create_wordcloud(wordcloud_id):
+    fingerprint = get_datasets().wordcloud_fingerprints.get(wordcloud_id)
+    path = wordcloud_path(wordcloud_id, fingerprint)
+    if fingerprint and os.path.exists(path):
+        st.image(path)
+    else:
+        metrics.miss("create_wordcloud")
+        st.image(render_wordcloud_live(wordcloud_id, get_dataset_version().number))
 
 def get_ads(occupation, location):
-    ads = [0, 0]
-    ads_selected_occupation = st.session_state.ad_data_platsbanken.get(occupation)
-    if ads_selected_occupation:
-        ads_selected_location = ads_selected_occupation.get(location)
-        if ads_selected_location:
-            ads[0] = ads_selected_location
-    ads_selected_occupation_historical = st.session_state.ad_data_historical.get(occupation)
-    if ads_selected_occupation_historical:
-        ads_selected_location_historical = ads_selected_occupation_historical.get(location)
-        if ads_selected_location_historical:
-            ads[1] = ads_selected_location_historical
-    return ads
+    return queries.get_ads(get_datasets(), occupation, location)
 
 def render_job_info_html(namn, överlappningsgrad, prognos, annonser, link):
     överlapp_dict = {0: 25, 0.5: 50, 1: 75}
@@ -392,62 +384,50 @@ def render_job_info_html(namn, överlappningsgrad, prognos, annonser, link):
     """
     return full_html
 
-def create_similar_occupations(ssyk_source, region_id):
+def build_similar_occupations(id_occupation, region_id):
     similar_1 = {}
     similar_2 = {}
 
-    for k, v in st.session_state.similar.items():
-        info_similar = st.session_state.occupationdata.get(k)
-        name_similar = info_similar["preferred_label"]
-        similar_description = info_similar["description"]
-        similar_group_id = info_similar["occupation_group_id"]
-
-        occupation_group = info_similar["occupation_group"]
-        ssyk_similar = occupation_group[0:4]
-        labour_flow_ssyk = st.session_state.labour_flow.get(ssyk_source)
-
-        if info_similar["barometer_id"]:
-            occupation_forecast = st.session_state.forecast.get(info_similar["barometer_id"])
-            if occupation_forecast:
-                regional_forecast = occupation_forecast.get(region_id)
-            else:
-                regional_forecast = None
-        else:
-            regional_forecast = None
-
-        ads = get_ads(similar_group_id, region_id)
-
-        similar_string = render_job_info_html(
-            name_similar, v, regional_forecast, ads, create_regional_link(similar_group_id, region_id))
+    for similar in queries.similar_occupations(get_datasets(), id_occupation, region_id):
+        k = similar["id"]
+        v = similar["overlap"]
+        name_similar = similar["name"]
+        similar_string = render_job_info_html(name_similar, v, similar["forecast"], similar["ads"], similar["link"])
 
-        if info_similar["esco_description"] == True:
-            description_string = f"<p style='font-size:16px;'><em>Beskrivning hämtad från relaterat ESCO-yrke.</em> {similar_description}</p>"
-            
+        if similar["esco_description"]:
+            description_string = f"<p style='font-size:16px;'><em>Beskrivning hämtad från relaterat ESCO-yrke.</em> {similar['description']}</p>"
         else:
-            description_string = f"<p style='font-size:16px;'>{similar_description}</p>"
+            description_string = f"<p style='font-size:16px;'>{similar['description']}</p>"
 
-        if ssyk_similar in labour_flow_ssyk:
+        if similar["labour_flow"]:
             similar_1[k] = [k, v, description_string, similar_string, name_similar]
-
         else:
             similar_2[k] = [k, v, description_string, similar_string, name_similar]
 
-    sorted_similar_1 = {k:v for k,v in sorted(similar_1.items(), key = lambda item: item[0])}
-    sorted_similar_2 = {k:v for k,v in sorted(similar_2.items(), key = lambda item: item[0])}
-    return sorted_similar_1, sorted_similar_2
+    return similar_1, similar_2
 
-@st.fragment
-def choose_related_locations(tab_name):
+@timed("create_similar_occupations")
+@st.cache_data(max_entries = 512, show_spinner = False)
+def create_similar_occupations(id_occupation, region_id, data_version = None):
+    metrics.miss("create_similar_occupations")
+    fragment = get_page_fragment(id_occupation, region_id)
+    if fragment and "similar" in fragment:
+        return tuple(fragment["similar"])
+    return build_similar_occupations(id_occupation, region_id)
+
+@dataset_fragment
+def choose_related_locations(tab_name, occupation_group_id, occupation_group):
+    data = get_datasets()
     info = "Tätorter hämtas från SCB. Förslag på orter baseras på en bedömning om relevans som beräknas utifrån befolkningstäthet, annonser på Platsbanken historiskt och avstånd. Avstånd är fågelvägen. Datat är i en första version."
     st.write(info)
 
-    valid_locations = sorted(st.session_state.valid_locations)
+    valid_locations = sorted(data.valid_locations)
     selected_location = st.selectbox(
         "Välj en ort",
         (valid_locations), placeholder = "", index = None)
 
     if selected_location:
-        id_selected_location = st.session_state.locations_id.get(selected_location)
+        id_selected_location = data.locations_id.get(selected_location)
 
         locations = create_list_locations(id_selected_location)
 
@@ -471,6 +451,13 @@ def choose_related_locations(tab_name):
                 string_location, hover_info = create_string_location(l)
                 st.markdown(string_location, unsafe_allow_html = True, help = hover_info)
 
+        st.subheader(f"Annonser i pendlingsområdet - {occupation_group}")
+        st.markdown("<p style='font-size:12px;'>Summerat över kommunerna för vald ort och orter med hög eller medel relevans.</p>", unsafe_allow_html = True)
+        commute_ads = data.commute_ad_index.get(id_selected_location, occupation_group_id)
+        c, d, e = st.columns(3)
+        c.metric(label = f"Platsbanken\n\n{selected_location}", value = commute_ads[0])
+        d.metric(label = f"2024\n\n{selected_location}", value = commute_ads[1])
+
         text_dataunderlag_närliggande_orter = "<strong>Dataunderlag</strong><br />Relevanta pendlingsorter baseras på avstånd mellan orter från öppen geodata, befolkningstäthet och annonsantal i Historiska annonser."
         
         st.write("---")
@@ -480,13 +467,50 @@ def choose_related_locations(tab_name):
         
         create_feedback("", tab_name, feedback_questions, selected_location)
 
+@dataset_fragment
+def show_educations(ssyk_code, occupation_group):
+    data = get_datasets()
+    education_index = data.education_index
+    utbildningstyper = education_index.by_ssyk.get(ssyk_code)
+    if not utbildningstyper:
+        return
+    possible_edu_string = f"<strong>Möjliga yrkesutbildningar - {occupation_group}</strong><br />"
+    st.markdown(f"<p style='font-size:24px;'>{possible_edu_string}</p>", unsafe_allow_html=True)
+
+    selected_location = st.selectbox(
+        "Visa utbildningar nära en ort",
+        sorted(data.valid_locations), placeholder = "Alla orter", index = None, key = "education_location",
+        help = "Utbildningar i ortens pendlingsområde, sorterade på avstånd fågelvägen. Utbildningsorter som inte finns bland tätorterna, t.ex. stadsdelar, visas bara utan vald ort.")
+
+    distances = {}
+    if selected_location:
+        near = education_index.near(ssyk_code, data.locations_id.get(selected_location))
+        utbildningstyper = {}
+        for key, value in near.items():
+            utbildningstyper[key] = [u for u, _ in value]
+            distances[key] = [d for _, d in value]
+        if not utbildningstyper:
+            st.write("Inga utbildningar i pendlingsområdet")
+
+    for key, value in utbildningstyper.items():
+        educational_string = create_educational_string(value, distances.get(key))
+        if key == "aub":
+            key = "arbetsmarknadsutbildning"
+        utbildningstyp = key.capitalize()
+
+        edu_type_string = f"<strong>{utbildningstyp}</strong><br />"
+        st.markdown(f"<p style='font-size:20px;'>{edu_type_string}</p>", unsafe_allow_html=True)
+
+        for e in educational_string:
+            st.markdown(e[0], unsafe_allow_html = True)
+
 @st.dialog("Annonsöverlapp", width = "large")
 def visa_venn(venn, beskrivning):
-    st.pyplot(venn)
+    st.image(venn)
     st.markdown(beskrivning, unsafe_allow_html = True) 
 
-def skapa_venn(name_choosen, name_similar, adwords_similar, degree_of_overlap):
-    venn = create_venn(name_choosen, name_similar, adwords_similar, degree_of_overlap)
+def skapa_venn(id_occupation, id_similar, degree_of_overlap):
+    venn = create_venn(id_occupation, id_similar, degree_of_overlap, get_dataset_version().number)
     return venn
 
 def create_dk_link(dk_names):
@@ -524,13 +548,13 @@ def create_no_link(no_names):
     return url, no_string
 
 def post_selected_occupation(id_occupation):
-    info = st.session_state.occupationdata.get(id_occupation)
+    data = get_datasets()
+    info = data.occupationdata.get(id_occupation)
     occupation_name = info["preferred_label"]
     occupation_group = info["occupation_group"]
     occupation_group_id = info["occupation_group_id"]
     occupation_field = info["occupation_field"]
     ssyk_code = occupation_group[0:4]
-    utbildningar = st.session_state.ssyk_utbildningar.get(ssyk_code)
     
     field_string = f"{occupation_field} (yrkesområde)"
     group_string = f"{occupation_group} (yrkesgrupp)"
@@ -541,15 +565,8 @@ def post_selected_occupation(id_occupation):
     else:
         barometer = None
 
-    if info["similar_occupations"]:
-        st.session_state.similar = info["similar_occupations"]
-    else:
-        st.session_state.similar = None
-
     description = info["description"]
     license = info["license"]
-    skills = info["skill"]
-    potential_skills = info["potential_skill"]
 
     if info["yrkessamling"]:
         yrkessamling = info["yrkessamling"]
@@ -581,7 +598,7 @@ def post_selected_occupation(id_occupation):
 
         st.subheader("Kompetensbegrepp och annonsord")
 
-        skill_string = create_skill_string(license, skills, potential_skills[0:10 - len(skills)])
+        skill_string = data.competence_index.skill_blocks.get(id_occupation, [])
 
         col1, col2 = st.columns(2)
 
@@ -591,13 +608,12 @@ def post_selected_occupation(id_occupation):
 
         with col2:
             if info["wordcloud_id"]:
-                st.session_state.adwords_occupation = st.session_state.adwords.get(info["wordcloud_id"])
                 if info["wordcloud_id"] == id_occupation:
                     st.markdown(f"<strong>Annonsord</strong> {occupation_name}", unsafe_allow_html = True)
-                    create_wordcloud(st.session_state.adwords_occupation)
+                    create_wordcloud(info["wordcloud_id"])
                 else:
                     st.markdown(f"<strong>Annonsord</strong> {occupation_group}", unsafe_allow_html = True)
-                    create_wordcloud(st.session_state.adwords_occupation)
+                    create_wordcloud(info["wordcloud_id"])
             else:
                 st.write("Inte tillräkligt med annonsunderlag för att kunna skapa ordmoln")
 
@@ -650,7 +666,7 @@ def post_selected_occupation(id_occupation):
 
         st.subheader(f"Annonser - {occupation_group}")
 
-        valid_regions = sorted(list(st.session_state.regions.keys()))
+        valid_regions = sorted(list(data.regions.keys()))
         valid_regions.append("Sverige")
 
         a, b = st.columns(2)
@@ -670,13 +686,18 @@ def post_selected_occupation(id_occupation):
             if st.session_state.selected_region == "Sverige":
                 selected_region_id = "i46j_HmG_v64"
             else:
-                selected_region_id = st.session_state.regions.get(st.session_state.selected_region)
+                selected_region_id = data.regions.get(st.session_state.selected_region)
         else:
             st.session_state.selected_region = "Sverige"
             selected_region_id = "i46j_HmG_v64"
 
-        ads = get_ads(occupation_group_id, selected_region_id)
-        link = create_regional_link(occupation_group_id, selected_region_id)
+        fragment = get_page_fragment(id_occupation, selected_region_id)
+        if fragment:
+            ads = fragment["ads"]
+            link = fragment["link"]
+        else:
+            ads = get_ads(occupation_group_id, selected_region_id)
+            link = create_regional_link(occupation_group_id, selected_region_id)
 
         c.metric(label = f"Platsbanken\n\n{st.session_state.selected_region}", value = ads[0])
         d.metric(label = f"2024\n\n{st.session_state.selected_region}", value = ads[1])
@@ -691,7 +712,7 @@ def post_selected_occupation(id_occupation):
         i, j = st.columns(2)
 
         if show_nordic:
-            dk_preflabels = st.session_state.occupation_id_dk_preflabel.get(id_occupation)
+            dk_preflabels = data.occupation_id_dk_preflabel.get(id_occupation)
             if dk_preflabels:
                 dk_link, dk_string = create_dk_link(dk_preflabels)
                 with g:
@@ -699,7 +720,7 @@ def post_selected_occupation(id_occupation):
                 with i:
                     st.link_button(f"Jobnet.dk - Köpenhamn och Bornholm", dk_link, icon = ":material/link:")
 
-            no_preflabels = st.session_state.occupation_id_no_preflabel.get(id_occupation)
+            no_preflabels = data.occupation_id_no_preflabel.get(id_occupation)
             if no_preflabels:
                 no_link, no_string = create_no_link(no_preflabels)
                 with h:
@@ -711,7 +732,7 @@ def post_selected_occupation(id_occupation):
 
         k, l, m = st.columns(3)
 
-        salary = st.session_state.ssyk_salary.get(ssyk_code)
+        salary = queries.get_salary(data, ssyk_code)
 
         salary_string1 = f"<p style='font-size:16px;'>10 % tjänar mindre än<br />Genomsnittslön<br />10% tjänar mer än</p>"
         salary_string2 = f"<p style='font-size:16px;'><strong>{salary[0]}<br />{salary[1]}<br />{salary[2]}</strong></p>"
@@ -746,28 +767,7 @@ def post_selected_occupation(id_occupation):
         else:
             st.write("Ingen data tillgänglig")
 
-        if utbildningar:
-            possible_edu_string = f"<strong>Möjliga yrkesutbildningar - {occupation_group}</strong><br />"    
-            st.markdown(f"<p style='font-size:24px;'>{possible_edu_string}</p>", unsafe_allow_html=True) 
-
-            utbildningstyper = {}
-            for u in utbildningar:
-                if u["utbildningstyp"] not in utbildningstyper:
-                    utbildningstyper[u["utbildningstyp"]] = []
-                utbildningstyper[u["utbildningstyp"]].append(u)
-            utbildningstyper = dict(sorted(utbildningstyper.items(), key = lambda x: x[0], reverse = False))
-
-            for key, value in utbildningstyper.items():
-                if key == "aub":
-                    key = "arbetsmarknadsutbildning"
-                utbildningstyp = key.capitalize()
-                educational_string = create_educational_string(value)
-
-                edu_type_string = f"<strong>{utbildningstyp}</strong><br />"    
-                st.markdown(f"<p style='font-size:20px;'>{edu_type_string}</p>", unsafe_allow_html=True) 
-
-                for e in educational_string:
-                    st.markdown(e[0], unsafe_allow_html = True)
+        show_educations(ssyk_code, occupation_group)
 
         text_dataunderlag_utbildning = "<strong>Dataunderlag</strong><br />Vanlig utbildningsbakgrund kommer från Tillväxtverkets Regionala matchningsindikatorer. Notera att grupperingen ibland sker på en högre nivå än yrkesgrupp.<br />Information om Arbetsmarknadsutbildningar är hämtade från Skolverkets SUSA-nav. Information om andra utbildningar är framräknade utifrån utbildninsnamn och taxonomin genom strängmatchning och JobAd Enrichments tillsammans med berikade historiska annonser."
 
@@ -791,7 +791,7 @@ def post_selected_occupation(id_occupation):
                 tree = create_tree(field_string, group_string, occupation_string, None, ["group"], yrkessamling, license)
         st.markdown(tree, unsafe_allow_html = True)
 
-        if st.session_state.similar:
+        if info["similar_occupations"]:
             if info["similar_yb_yb"] == True:
                 st.subheader(f"Närliggande yrken - {occupation_name}")
             else:
@@ -806,7 +806,7 @@ def post_selected_occupation(id_occupation):
             headline_1 = "<strong>Vanlig yrkesväxling och annonsöverlapp</strong>"
             headline_2 = "<strong>Annonsöverlapp</strong>"
 
-            similar_1, similar_2 = create_similar_occupations(ssyk_code, selected_region_id)
+            similar_1, similar_2 = create_similar_occupations(id_occupation, selected_region_id, get_dataset_version().number)
 
             with col1:
                 st.markdown(f"<p style='font-size:16px;'>{headline_1}</p>", unsafe_allow_html=True)
@@ -816,8 +816,7 @@ def post_selected_occupation(id_occupation):
                         e.markdown(value[3], unsafe_allow_html=True)
                     with f:
                         if st.button("", icon = ":material/join_inner:", key = key):
-                            adwords_similar = st.session_state.adwords.get(value[0])
-                            venn = skapa_venn(occupation_name, value[4], adwords_similar, value[1])
+                            venn = skapa_venn(id_occupation, value[0], value[1])
                             visa_venn(venn, value[2])
              
             with col2:
@@ -828,8 +827,7 @@ def post_selected_occupation(id_occupation):
                         e.markdown(value[3], unsafe_allow_html=True)
                     with f:
                         if st.button("", icon = ":material/join_inner:", key = key):
-                            adwords_similar = st.session_state.adwords.get(value[0])
-                            venn = skapa_venn(occupation_name, value[4], adwords_similar, value[1])
+                            venn = skapa_venn(id_occupation, value[0], value[1])
                             visa_venn(venn, value[2])
 
         else:
@@ -845,25 +843,27 @@ def post_selected_occupation(id_occupation):
 
     with tab5:
         st.subheader("Relevanta pendlingsorter")
-        choose_related_locations(tab_names[4])
+        choose_related_locations(tab_names[4], occupation_group_id, occupation_group)
 
 def choose_occupation_name():
+    data = get_datasets()
     show_initial_information()
     col1, col2 = st.columns([0.7, 0.3])
 
     with col1:
-        if st.session_state.get("no_ed_req", False):
-            selected_occupation_name = st.selectbox(
-                "Välj en yrkesbenämning",
-                st.session_state.valid_occupations_names_no_educational_req,
-                placeholder="",
-                index=None)
-        else:
-            selected_occupation_name = st.selectbox(
-                "Välj en yrkesbenämning",
-                st.session_state.valid_occupation_names,
-                placeholder="",
-                index=None)
+        allowed = data.valid_occupations_no_educational_req if st.session_state.get("no_ed_req", False) else None
+        occupation_query = st.text_input(
+            "Sök yrkesbenämning",
+            help = "Söker bland yrkesbenämningar, yrkesgrupper och danska och norska benämningar och klarar felstavningar.")
+        # Bara träffarna från sökindexet skickas till webbläsaren, inte hela listan med benämningar.
+        matches = data.occupation_search.search(occupation_query, 20, allowed) if occupation_query else []
+        matched_labels = {name: label for name, label, _ in matches}
+        selected_occupation_name = st.selectbox(
+            "Välj en yrkesbenämning",
+            list(matched_labels),
+            format_func = lambda name: name if matched_labels[name] == name else f"{name} ({matched_labels[name]})",
+            placeholder = "Inga träffar" if occupation_query else "",
+            index = 0 if matches else None)
 
     with col2:
         st.markdown(
@@ -875,14 +875,51 @@ def choose_occupation_name():
             help="Yrken utan utbildningskrav är ett urval av yrken som vanligtvis inte kräver en yrkesutbildning.")
         st.markdown("</div>", unsafe_allow_html=True)
 
+    with st.expander("Hitta yrken via kompetens"):
+        competence_query = st.text_input(
+            "Sök kompetens",
+            help = "Söker i kompetensbegreppens namn och beskrivningar. Yrken med reglerade behörigheter och kvalitetssäkrade begrepp som matchar visas först.")
+        competence_matches = data.competence_index.occupations(competence_query) if competence_query else []
+        matched_terms = dict(competence_matches)
+        id_competence_occupation = st.selectbox(
+            "Yrken med matchande kompetenser",
+            list(matched_terms),
+            format_func = lambda id: f"{data.occupationdata[id]['preferred_label']} ({', '.join(matched_terms[id][:3])})",
+            placeholder = f"{len(competence_matches)} träffar" if competence_query else "",
+            index = None)
+
     if selected_occupation_name:
-        plt.close("all")
-        id_selected_occupation = st.session_state.valid_occupations.get(selected_occupation_name)
+        id_selected_occupation = data.valid_occupations.get(selected_occupation_name)
         post_selected_occupation(id_selected_occupation)
+    elif id_competence_occupation:
+        post_selected_occupation(id_competence_occupation)
+
+def debug_enabled():
+    return os.environ.get("YRKESINFO_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
+def show_debug_panel(session_size):
+    data = get_datasets()
+    with st.sidebar:
+        st.subheader("Mätvärden")
+        st.metric("Sessionens state", f"{session_size} byte")
+        st.markdown("<strong>Anrop</strong>", unsafe_allow_html = True)
+        st.json(metrics.as_dict()["functions"], expanded = False)
+        st.markdown("<strong>Laddade dataset (ms)</strong>", unsafe_allow_html = True)
+        st.json(data.touched, expanded = False)
+        st.download_button("Prometheus", metrics.prometheus_text(), file_name = "metrics.prom", mime = "text/plain")
+        st.download_button("JSON", metrics.as_json(), file_name = "metrics.json", mime = "application/json")
 
 def main ():
-    initiate_session_state()
-    choose_occupation_name()
+    # Körningen håller en datasetversion från början till slut, även om en ny byts in under tiden.
+    # Felsökningspanelen läser också dataseten och körs därför medan versionen hålls.
+    with hold_dataset_version():
+        with measure("rerun"):
+            initiate_session_state()
+            choose_occupation_name()
+        session_size = state_size(st.session_state.to_dict())
+        metrics.observe_size("session_state", session_size)
+        if debug_enabled():
+            show_debug_panel(session_size)
     
 if __name__ == '__main__':
     main ()
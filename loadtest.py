@@ -0,0 +1,117 @@
+"""Lasttest av api.py med många samtidiga keep-alive-anslutningar.
+
+Frågorna blandar yrken, närliggande yrken, annonser och tätorter med
+slumpade id:n ur datasetfilerna, så att både cachade och nya svar mäts:
+
+    uvicorn api:app --port 8000 --workers 4 --no-access-log
+    python loadtest.py --url http://127.0.0.1:8000 --connections 64 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from urllib.parse import quote, urlsplit
+from datastore import DATASET_FILES
+
+def request_paths(count, seed = 1):
+    """count slumpade sökvägar fördelade ungefär som appens egna uppslag."""
+    with open(DATASET_FILES["valid_occupations"]) as file:
+        occupations = json.load(file)
+    with open(DATASET_FILES["regions"]) as file:
+        regions = list(json.load(file).values())
+    with open(DATASET_FILES["locations_id"]) as file:
+        localities = list(json.load(file).values())
+    with open(DATASET_FILES["occupationdata"]) as file:
+        groups = sorted({info["occupation_group_id"] for info in json.load(file).values()})
+    names = sorted(occupations)
+    rng = random.Random(seed)
+    paths = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.35:
+            paths.append(f"/occupations/{occupations[rng.choice(names)]}?region={rng.choice(regions)}")
+        elif kind < 0.6:
+            paths.append(f"/occupations/{occupations[rng.choice(names)]}/similar?region={rng.choice(regions)}")
+        elif kind < 0.8:
+            paths.append(f"/groups/{rng.choice(groups)}/ads?location={rng.choice(regions)}")
+        elif kind < 0.9:
+            paths.append(f"/localities/{quote(rng.choice(localities))}")
+        else:
+            name = rng.choice(names)
+            paths.append(f"/search?q={quote(name[:rng.randint(3, max(len(name), 3))])}")
+    return paths
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    length = 0
+    for line in lines[1:]:
+        if line.lower().startswith("content-length:"):
+            length = int(line.split(":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+async def connection(host, port, paths, deadline, latencies, statuses):
+    """Skicka förfrågningar till deadline. En bruten anslutning räknas som fel och öppnas igen."""
+    i = random.randrange(len(paths))
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError as error:
+            count_error(statuses, error)
+            await asyncio.sleep(0.1)
+            continue
+        try:
+            while time.perf_counter() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                start = time.perf_counter()
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+                status = await read_response(reader)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+        except (OSError, asyncio.IncompleteReadError, ValueError) as error:
+            count_error(statuses, error)
+        finally:
+            writer.close()
+
+def count_error(statuses, error):
+    # Fel utan HTTP-svar räknas under undantagets namn, t.ex. ConnectionResetError.
+    name = type(error).__name__
+    statuses[name] = statuses.get(name, 0) + 1
+
+async def run(url, connections, duration, paths):
+    parts = urlsplit(url)
+    latencies = []
+    statuses = {}
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(connection(parts.hostname, parts.port or 80, paths, deadline, latencies, statuses)
+                           for _ in range(connections)))
+    return time.perf_counter() - start, latencies, statuses
+
+def main():
+    parser = argparse.ArgumentParser(description = "Mät genomströmning och svarstider för api.py.")
+    parser.add_argument("--url", default = "http://127.0.0.1:8000")
+    parser.add_argument("--connections", type = int, default = 64)
+    parser.add_argument("--duration", type = float, default = 10)
+    parser.add_argument("--paths", type = int, default = 20000, help = "Antal olika slumpade sökvägar")
+    args = parser.parse_args()
+
+    paths = request_paths(args.paths)
+    seconds, latencies, statuses = asyncio.run(run(args.url, args.connections, args.duration, paths))
+    latencies.sort()
+    print(f"{len(latencies)} förfrågningar på {seconds:.1f} s med {args.connections} anslutningar: {len(latencies) / seconds:.0f} per sekund")
+    if len(latencies) >= 2:
+        quantiles = statistics.quantiles(latencies, n = 100)
+        print(f"Svarstid median {quantiles[49] * 1000:.1f} ms, p95 {quantiles[94] * 1000:.1f} ms, p99 {quantiles[98] * 1000:.1f} ms")
+    print("Statuskoder:", ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key = lambda s: str(s[0]))))
+    failures = sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 500)
+    if failures:
+        print(f"Fel: {failures}")
+
+if __name__ == "__main__":
+    main()
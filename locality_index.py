@@ -0,0 +1,162 @@
+import numpy as np
+from concept_index import ConceptIds
+
+RELEVANCE_ORDER = {"hög": 0, "medel": 1, "låg": 2}
+RELEVANCE_NAMES = list(RELEVANCE_ORDER)
+
+def split_town_municipality(town_municipality, municipality_id_namn):
+    town_municipality_split = town_municipality.split(";")
+    municipality_id = town_municipality_split[1]
+    municipality_name = municipality_id_namn.get(municipality_id)
+    town_split = town_municipality_split[0]
+    city_name = ' '.join(town_split.split("_"))
+    town_with_municipality = f"{city_name.capitalize()} ({municipality_name.capitalize()})"
+    return town_with_municipality, f"{municipality_name} kommun"
+
+def sorted_rows(row_count, rows, columns, distances, sort_keys):
+    """Gruppera kanter per rad i CSR-form, inom raden sorterade efter sort_keys."""
+    order = np.lexsort((*sort_keys[::-1], rows))
+    offsets = np.zeros(row_count + 1, dtype = np.int32)
+    np.cumsum(np.bincount(rows, minlength = row_count), out = offsets[1:])
+    return offsets, columns[order], distances[order], order
+
+class LocalityIndex:
+    """Tätorter med förbearbetade grannlistor ur ort_ort_relevans.json.
+
+    ranked listar grannarna i den ordning fliken Relevanta pendlingsorter visar
+    dem, med visningsnamn redan uppslagna. within svarar på vilka orter som
+    ligger inom ett visst avstånd. Datat har inga koordinater, bara parvisa
+    avstånd fågelvägen upp till 70 km, så within söker bland kända avstånd i
+    båda riktningarna och inte i ett spatialt träd.
+    """
+
+    def __init__(self, geodata, municipality_id_namn):
+        self.localities = ConceptIds(sorted(geodata))
+        for neighbours in geodata.values():
+            for n in neighbours:
+                self.localities.add(n["ort2_id"])
+        count = len(self.localities)
+
+        self.display_names = []
+        self.municipality_names = []
+        self.municipality_ids = []
+        for locality_id in self.localities.ids:
+            town_with_municipality, municipality_name = split_town_municipality(locality_id, municipality_id_namn)
+            self.display_names.append(town_with_municipality)
+            self.municipality_names.append(municipality_name)
+            self.municipality_ids.append(locality_id.split(";")[1])
+
+        rows = []
+        columns = []
+        distances = []
+        relevance = []
+        for locality_id, neighbours in geodata.items():
+            row = self.localities.get(locality_id)
+            for n in neighbours:
+                rows.append(row)
+                columns.append(self.localities.get(n["ort2_id"]))
+                distances.append(n["avstånd"])
+                relevance.append(RELEVANCE_ORDER[n["relevans"]])
+        rows = np.array(rows, dtype = np.int32)
+        columns = np.array(columns, dtype = np.int32)
+        distances = np.array(distances, dtype = np.float64)
+        relevance = np.array(relevance, dtype = np.int8)
+
+        self.ranked_offsets, self.ranked_neighbours, self.ranked_distances, order = sorted_rows(
+            count, rows, columns, distances, [relevance, distances])
+        self.ranked_relevance = relevance[order]
+
+        # Avstånden gäller åt båda hållen, så radiesökningen använder båda riktningarna.
+        both_rows = np.concatenate([rows, columns])
+        both_columns = np.concatenate([columns, rows])
+        both_distances = np.concatenate([distances, distances])
+        pairs = np.unique(np.stack([both_rows, both_columns]), axis = 1, return_index = True)[1]
+        self.nearby_offsets, self.nearby_neighbours, self.nearby_distances, _ = sorted_rows(
+            count, both_rows[pairs], both_columns[pairs], both_distances[pairs], [both_distances[pairs]])
+
+    def location(self, position, distance, relevance):
+        return {
+            "town_with_municipality": self.display_names[position],
+            "municipality": self.municipality_names[position],
+            "distance": distance,
+            "relevance": relevance}
+
+    def ranked(self, locality_id):
+        """Orten själv följd av dess grannar efter relevans och avstånd."""
+        position = self.localities.get(locality_id)
+        start, end = self.ranked_offsets[position], self.ranked_offsets[position + 1]
+        all_locations = [self.location(position, 0, "hög")]
+        for neighbour, distance, relevance in zip(
+                self.ranked_neighbours[start:end].tolist(),
+                self.ranked_distances[start:end].tolist(),
+                self.ranked_relevance[start:end].tolist()):
+            all_locations.append(self.location(neighbour, distance, RELEVANCE_NAMES[relevance]))
+        return all_locations
+
+    def within(self, locality_id, kilometers):
+        """Orter inom kilometers km fågelvägen, som lista av (ort-id, avstånd) sorterad på avstånd."""
+        position = self.localities.get(locality_id)
+        if position is None:
+            return []
+        start, end = self.nearby_offsets[position], self.nearby_offsets[position + 1]
+        stop = start + np.searchsorted(self.nearby_distances[start:end], kilometers, side = "right")
+        return [(self.localities[n], d) for n, d in zip(
+            self.nearby_neighbours[start:stop].tolist(), self.nearby_distances[start:stop].tolist())]
+
+def commute_sums(membership, municipality_counts):
+    # Heltalsmatriser multipliceras utan BLAS i numpy. Summorna ryms exakt i float64.
+    sums = membership.astype(np.float64) @ municipality_counts.T.astype(np.float64)
+    return np.rint(sums).astype(np.int32)
+
+class CommuteAdIndex:
+    """Annonser per yrkesgrupp summerade över en orts pendlingsområde.
+
+    Pendlingsområdet är ortens egen kommun och kommunerna för alla grannar med
+    minst relevans max_relevance. Medlemskapet ort x kommun lagras som matris
+    så att summan för alla orter och yrkesgrupper blir en matrisprodukt.
+    """
+
+    def __init__(self, localities, ads, max_relevance = "medel"):
+        self.localities = localities
+        self.groups = ads.groups
+        municipalities = ads.municipalities
+        unknown = set()
+
+        def columns(municipality_ids):
+            # Ett None som index lägger till en axel i numpy och skulle markera hela raden.
+            found = []
+            for municipality_id in municipality_ids:
+                column = municipalities.get(municipality_id)
+                if column is None:
+                    unknown.add(str(municipality_id))
+                else:
+                    found.append(column)
+            return found
+
+        self.membership = np.zeros((len(localities.localities), len(municipalities)), dtype = np.int32)
+        limit = RELEVANCE_ORDER[max_relevance]
+        for position in range(len(localities.localities)):
+            start, end = localities.ranked_offsets[position], localities.ranked_offsets[position + 1]
+            neighbours = localities.ranked_neighbours[start:end][localities.ranked_relevance[start:end] <= limit]
+            own = [localities.municipality_ids[position]]
+            self.membership[position, columns(own + [localities.municipality_ids[n] for n in neighbours.tolist()])] = 1
+        if unknown:
+            print(f"{len(unknown)} kommuner saknas i kommun_region.json och hoppas över i pendlingsområdena: {', '.join(sorted(unknown)[:10])}")
+        self.unknown_municipalities = sorted(unknown)
+        municipality_columns = len(municipalities)
+        self.ads_now = commute_sums(self.membership, ads.ads_now[:, :municipality_columns])
+        self.ads_2024 = commute_sums(self.membership, ads.ads_2024[:, :municipality_columns])
+        self.municipality_ids = municipalities.ids
+
+    def municipalities(self, locality_id):
+        position = self.localities.localities.get(locality_id)
+        if position is None:
+            return []
+        return [self.municipality_ids[m] for m in np.flatnonzero(self.membership[position]).tolist()]
+
+    def get(self, locality_id, occupation_group_id):
+        row = self.localities.localities.get(locality_id)
+        column = self.groups.get(occupation_group_id)
+        if row is None or column is None:
+            return [0, 0]
+        return [int(self.ads_now[row, column]), int(self.ads_2024[row, column])]
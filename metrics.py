@@ -0,0 +1,183 @@
+"""Tidsmätning, cacheträffar och sessionsstorlek för appens tunga anrop.
+
+Mätvärdena samlas per process och kan läsas som Prometheus-text eller JSON.
+Appen visar dem i sidopanelen när YRKESINFO_DEBUG=1 är satt eller sidan
+öppnas med ?debug=1.
+"""
+import functools
+import json
+import pickle
+import sys
+import threading
+import time
+
+# Övre gränser i sekunder för histogrammens hinkar.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+PREFIX = "yrkesinfo"
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip([*self.buckets, float("inf")], self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """Övre gränsen för hinken där kvantilen q hamnar, eller None om den hamnar över den största gränsen.
+
+        None i stället för oändligheten, som inte kan skrivas som giltig JSON.
+        """
+        target = q * self.count
+        for bound, total in self.cumulative():
+            if total >= target:
+                return None if bound == float("inf") else bound
+        return None
+
+def milliseconds(seconds):
+    return None if seconds is None else seconds * 1000
+
+class Metrics:
+    """Processgemensamma mätvärden. Alla metoder är trådsäkra."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.calls = {}
+        self.misses = {}
+        self.sizes = {}
+        self.gauges = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.durations.get(name)
+            if histogram is None:
+                histogram = self.durations[name] = Histogram(BUCKETS)
+            histogram.observe(seconds)
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def miss(self, name):
+        """Räkna en cachemiss för name. Träffar är anrop till name minus missar."""
+        with self.lock:
+            self.misses[name] = self.misses.get(name, 0) + 1
+
+    def observe_size(self, name, size):
+        with self.lock:
+            histogram = self.sizes.get(name)
+            if histogram is None:
+                histogram = self.sizes[name] = Histogram(SIZE_BUCKETS)
+            histogram.observe(size)
+
+    def set_gauge(self, name, labels, value):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def timed(self, name = None):
+        """Dekorator som mäter varje anrop, även de som besvaras från en cache."""
+        def decorator(function):
+            label = name or function.__name__
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(label, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def measure(self, name):
+        """Kontexthanterare för kod som inte är en egen funktion."""
+        return Measurement(self, name)
+
+    def as_dict(self):
+        with self.lock:
+            functions = {}
+            for name, histogram in self.durations.items():
+                functions[name] = {
+                    "calls": histogram.count,
+                    "total_ms": round(histogram.sum * 1000, 1),
+                    "mean_ms": round(histogram.sum / histogram.count * 1000, 2),
+                    "p50_ms_upper": milliseconds(histogram.quantile(0.5)),
+                    "p95_ms_upper": milliseconds(histogram.quantile(0.95))}
+                if name in self.misses:
+                    functions[name]["cache_misses"] = self.misses[name]
+                    functions[name]["cache_hits"] = max(histogram.count - self.misses[name], 0)
+            sizes = {name: {"count": h.count, "mean_bytes": round(h.sum / h.count)} for name, h in self.sizes.items()}
+            gauges = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.gauges.items()]
+        return {"functions": functions, "sizes": sizes, "gauges": gauges}
+
+    def as_json(self):
+        return json.dumps(self.as_dict(), ensure_ascii = False, indent = 2)
+
+    def prometheus_text(self):
+        lines = []
+        with self.lock:
+            lines.append(f"# TYPE {PREFIX}_duration_seconds histogram")
+            for name, histogram in sorted(self.durations.items()):
+                append_histogram(lines, f"{PREFIX}_duration_seconds", f'function="{name}"', histogram)
+            lines.append(f"# TYPE {PREFIX}_cache_misses_total counter")
+            for name, count in sorted(self.misses.items()):
+                lines.append(f'{PREFIX}_cache_misses_total{{function="{name}"}} {count}')
+            lines.append(f"# TYPE {PREFIX}_size_bytes histogram")
+            for name, histogram in sorted(self.sizes.items()):
+                append_histogram(lines, f"{PREFIX}_size_bytes", f'name="{name}"', histogram)
+            gauge_names = sorted({name for name, _ in self.gauges})
+            for gauge in gauge_names:
+                lines.append(f"# TYPE {PREFIX}_{gauge} gauge")
+                for (name, labels), value in sorted(self.gauges.items()):
+                    if name == gauge:
+                        label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                        lines.append(f"{PREFIX}_{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+def append_histogram(lines, metric, labels, histogram):
+    for bound, total in histogram.cumulative():
+        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+        lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {total}')
+    lines.append(f"{metric}_sum{{{labels}}} {histogram.sum:.6f}")
+    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+class Measurement:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+def state_size(state):
+    """Ungefärlig storlek i byte: picklad storlek, eller sys.getsizeof för värden som inte kan picklas."""
+    size = 0
+    for key, value in state.items():
+        try:
+            size += len(pickle.dumps(value, protocol = pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            size += sys.getsizeof(value)
+        size += len(str(key))
+    return size
+
+metrics = Metrics()
+timed = metrics.timed
+measure = metrics.measure
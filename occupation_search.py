@@ -0,0 +1,198 @@
+"""Sökindex för yrkesbenämningar med prefixträd och trigram.
+
+Indexet täcker yrkesbenämningarna i valid_occupations.json, yrkesgrupperna och
+de danska och norska benämningarna. Mät svarstiden mot en frågelogg med en fråga
+per rad, eller mot en syntetisk logg med prefix och felstavningar:
+
+    python occupation_search.py benchmark --log queries.txt
+"""
+import argparse
+import random
+import re
+import statistics
+import time
+import unicodedata
+import numpy as np
+
+# Ordning när två träffar annars är lika bra.
+LABEL_KINDS = {"benämning": 0, "yrkesgrupp": 1, "danska": 2, "norska": 2}
+FOLDED_LETTERS = str.maketrans({"æ": "ae", "ø": "o", "ß": "ss"})
+MIN_SIMILARITY = 0.35
+COMBINING_MARKS = re.compile("[\u0300-\u036f]")
+NON_WORD = re.compile(r"[\W_]+")
+
+def fold(text):
+    """Gemener utan diakritiska tecken och skiljetecken, så att 'Förare' och 'forare' blir lika."""
+    text = COMBINING_MARKS.sub("", unicodedata.normalize("NFKD", text.lower().translate(FOLDED_LETTERS)))
+    return NON_WORD.sub(" ", text).strip()
+
+def trigrams(folded):
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class OccupationSearch:
+    """Typeahead över yrkesbenämningar. search ger yrkesbenämningar, inte de matchade etiketterna.
+
+    Varje etikett (benämning, yrkesgrupp, dansk eller norsk benämning) pekar på
+    en eller flera svenska yrkesbenämningar. Prefixträdet har etiketternas ord
+    som nycklar och varje nod håller alla etiketter med ett ord som börjar så.
+    Trigrammen fångar felstavningar och delar av sammansatta ord.
+    """
+
+    def __init__(self, valid_occupations, occupationdata, dk_preflabels, no_preflabels):
+        names_by_id = {}
+        for name, occupation_id in valid_occupations.items():
+            names_by_id.setdefault(occupation_id, []).append(name)
+        groups = {}
+        for occupation_id, names in names_by_id.items():
+            info = occupationdata.get(occupation_id)
+            if info and info.get("occupation_group"):
+                groups.setdefault(info["occupation_group"], []).extend(names)
+
+        self.labels = []
+        self.kinds = []
+        self.targets = []
+        for name in valid_occupations:
+            self.add_label(name, "benämning", [name])
+        for group, names in groups.items():
+            self.add_label(group, "yrkesgrupp", sorted(names))
+        for kind, preflabels in (("danska", dk_preflabels), ("norska", no_preflabels)):
+            for occupation_id, labels in preflabels.items():
+                names = names_by_id.get(occupation_id)
+                if names:
+                    for label in labels:
+                        self.add_label(label, kind, names)
+
+        self.folded = [fold(l) for l in self.labels]
+        self.lowered = [l.lower() for l in self.labels]
+        self.trie = {}
+        trigram_postings = {}
+        for position, folded in enumerate(self.folded):
+            for word in set(folded.split()):
+                node = self.trie
+                for character in word:
+                    node = node.setdefault(character, {})
+                    node.setdefault("", []).append(position)
+            for trigram in trigrams(folded):
+                trigram_postings.setdefault(trigram, []).append(position)
+        self.trigram_postings = {t: np.array(p, dtype = np.int32) for t, p in trigram_postings.items()}
+        self.trigram_counts = np.array([len(trigrams(f)) for f in self.folded], dtype = np.float64)
+        self.kind_order = np.array([LABEL_KINDS[k] for k in self.kinds], dtype = np.int8)
+
+    def add_label(self, label, kind, names):
+        self.labels.append(label)
+        self.kinds.append(kind)
+        self.targets.append(names)
+
+    def prefix_matches(self, words):
+        """Etiketter där varje ord i frågan är början på något ord i etiketten."""
+        matches = None
+        for word in words:
+            node = self.trie
+            for character in word:
+                node = node.get(character)
+                if node is None:
+                    return set()
+            positions = node[""]
+            matches = set(positions) if matches is None else matches.intersection(positions)
+        return matches or set()
+
+    def similar(self, folded):
+        """Etiketter vars trigram liknar frågans, som {position: Dice-koefficient}."""
+        query_trigrams = [self.trigram_postings[t] for t in trigrams(folded) if t in self.trigram_postings]
+        if not query_trigrams:
+            return {}
+        hits = np.bincount(np.concatenate(query_trigrams), minlength = len(self.labels))
+        scores = 2 * hits / (self.trigram_counts + len(trigrams(folded)))
+        candidates = np.flatnonzero(scores >= MIN_SIMILARITY)
+        return dict(zip(candidates.tolist(), scores[candidates].tolist()))
+
+    def search(self, query, limit = 20, allowed = None):
+        """De limit bästa yrkesbenämningarna för query som lista av (benämning, matchad etikett, typ).
+
+        allowed begränsar svaren till en mängd benämningar, t.ex. yrken utan utbildningskrav.
+        """
+        limit = max(limit, 1)
+        folded = fold(query)
+        if not folded:
+            return []
+        lowered = query.strip().lower()
+        scored = {}
+        for position in self.prefix_matches(folded.split()):
+            label = self.folded[position]
+            # Rätt stavning med å, ä och ö väger tyngre än en träff som bara stämmer efter vikningen.
+            score = 2.0 + (label == folded) + label.startswith(folded) + 0.5 * self.lowered[position].startswith(lowered)
+            scored[position] = score
+        if len(scored) < limit:
+            for position, similarity in self.similar(folded).items():
+                scored.setdefault(position, similarity)
+
+        ranked = sorted(scored.items(), key = lambda x: (-x[1], self.kind_order[x[0]], len(self.labels[x[0]]), self.labels[x[0]]))
+        results = []
+        seen = set()
+        for position, _ in ranked:
+            for name in self.targets[position]:
+                if name in seen or (allowed is not None and name not in allowed):
+                    continue
+                seen.add(name)
+                results.append((name, self.labels[position], self.kinds[position]))
+                if len(results) == limit:
+                    return results
+        return results
+
+def synthetic_query_log(search, count = 2000, seed = 1):
+    """Frågor som de som skrivs i rutan: prefix av etiketter, ord mitt i etiketter och felstavningar."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        label = rng.choice(search.labels)
+        kind = rng.random()
+        if kind < 0.5:
+            queries.append(label[:rng.randint(2, max(2, len(label)))])
+        elif kind < 0.7:
+            queries.append(rng.choice(label.split()))
+        else:
+            characters = list(label.lower())
+            if len(characters) > 3:
+                i = rng.randrange(1, len(characters) - 1)
+                characters[i], characters[i + 1] = characters[i + 1], characters[i]
+            queries.append("".join(characters)[:rng.randint(4, max(4, len(characters)))])
+    return queries
+
+def benchmark(queries, limit = 20):
+    # datastore bygger indexet som härlett dataset och importerar därför den här modulen.
+    from datastore import Datasets
+    start = time.perf_counter()
+    search = Datasets().occupation_search
+    print(f"Byggde index med {len(search.labels)} etiketter på {(time.perf_counter() - start) * 1000:.0f} ms")
+    queries = queries or synthetic_query_log(search)
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        search.search(query, limit)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{len(timings)} frågor: median {statistics.median(timings):.2f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95)]:.2f} ms, p99 {timings[int(len(timings) * 0.99)]:.2f} ms, max {timings[-1]:.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Sök bland yrkesbenämningar och mät svarstiden.")
+    parser.add_argument("command", choices = ["search", "benchmark"])
+    parser.add_argument("query", nargs = "?", default = "")
+    parser.add_argument("--log", help = "Frågelogg med en fråga per rad")
+    parser.add_argument("--limit", type = int, default = 20)
+    args = parser.parse_args()
+
+    if args.command == "search":
+        from datastore import Datasets
+        for name, label, kind in Datasets().occupation_search.search(args.query, args.limit):
+            print(f"{name:<50}{label} ({kind})")
+    else:
+        queries = None
+        if args.log:
+            with open(args.log, encoding = "utf-8") as file:
+                queries = [line.strip() for line in file if line.strip()]
+        benchmark(queries, args.limit)
+
+if __name__ == "__main__":
+    main()
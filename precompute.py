@@ -0,0 +1,176 @@
+"""Förberäknar sidfragment för alla kombinationer av yrkesbenämning och region.
+
+Datat ändras bara mellan releaser, så annonser, Platsbankslänk och listorna
+under Närliggande yrken kan byggas i förväg för alla 2 601 yrkesbenämningar
+och 22 regionval. Detsamma gäller annonsordens överlapp för varje par av
+yrke och närliggande yrke som Venn-diagrammen visar:
+
+    python precompute.py --processes 8
+
+Resultatet skrivs till fragments.sqlite. Filen bär ett fingeravtryck av
+JSON-källorna och appen använder den bara så länge fingeravtrycket stämmer.
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from concept_index import SWEDEN_ID
+from snapshot import file_hash
+
+FRAGMENT_FILE = "fragments.sqlite"
+
+def dataset_fingerprint(files):
+    fingerprint = hashlib.sha1()
+    for name, source in sorted(files.items()):
+        if os.path.exists(source):
+            fingerprint.update(f"{name}:{file_hash(source)};".encode("utf-8"))
+    return fingerprint.hexdigest()
+
+def compress(payload, zdict):
+    compressor = zlib.compressobj(9, zdict = zdict)
+    return compressor.compress(payload) + compressor.flush()
+
+def decompress(blob, zdict):
+    decompressor = zlib.decompressobj(zdict = zdict)
+    return decompressor.decompress(blob) + decompressor.flush()
+
+class FragmentStore:
+    """Läser förberäknade fragment ur fragments.sqlite, en anslutning per tråd."""
+
+    def __init__(self, filename = FRAGMENT_FILE):
+        self.filename = filename
+        self.local = threading.local()
+        self.zdict = self.meta("zdict")
+
+    def connection(self):
+        if not hasattr(self.local, "connection"):
+            self.local.connection = sqlite3.connect(f"file:{self.filename}?mode=ro", uri = True)
+        return self.local.connection
+
+    def meta(self, key):
+        row = self.connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, occupation_id, region_id):
+        row = self.connection().execute(
+            "SELECT payload FROM fragments WHERE occupation_id = ? AND region_id = ?",
+            (occupation_id, region_id)).fetchone()
+        if row:
+            return json.loads(decompress(row[0], self.zdict))
+        return None
+
+    def get_venn(self, occupation_id, similar_id, degree_of_overlap):
+        row = self.connection().execute(
+            "SELECT overlap FROM venn WHERE occupation_id = ? AND similar_id = ? AND degree_of_overlap = ?",
+            (occupation_id, similar_id, degree_of_overlap)).fetchone()
+        if row:
+            return json.loads(row[0])
+        return None
+
+def open_fragment_store(files, filename = FRAGMENT_FILE):
+    """FragmentStore om filen finns och byggdes från samma data, annars None."""
+    if not os.path.exists(filename):
+        return None
+    try:
+        store = FragmentStore(filename)
+        if store.meta("fingerprint") != dataset_fingerprint(files):
+            print(f"{filename} är byggd från annan data och används inte")
+            return None
+        return store
+    except sqlite3.Error as error:
+        print(f"{filename} kan inte användas: {error}")
+        return None
+
+def region_choices(data):
+    return [*sorted(data.regions.values()), SWEDEN_ID]
+
+def fragment_payload(id_occupation, region_id):
+    # Importeras här så att arbetsprocesserna laddar appens byggstenar själva.
+    import infodemo
+    info = infodemo.get_datasets().occupationdata.get(id_occupation)
+    group_id = info["occupation_group_id"]
+    payload = {
+        "ads": infodemo.get_ads(group_id, region_id),
+        "link": infodemo.create_regional_link(group_id, region_id)}
+    if info["similar_occupations"]:
+        payload["similar"] = infodemo.build_similar_occupations(id_occupation, region_id)
+    return json.dumps(payload, ensure_ascii = False).encode("utf-8")
+
+def compression_dictionary(occupation_ids):
+    # Ett urval färdiga fragment blir förinställd ordlista för zlib. HTML-mallarna
+    # som upprepas i varje kort behöver då inte lagras om i varje rad.
+    sample = occupation_ids[::max(1, len(occupation_ids) // 24)]
+    return b"".join(fragment_payload(o, SWEDEN_ID) for o in sample)[-32768:]
+
+worker_zdict = None
+
+def init_worker(zdict):
+    global worker_zdict
+    worker_zdict = zdict
+
+def build_fragments(id_occupation, region_ids):
+    return [(id_occupation, r, compress(fragment_payload(id_occupation, r), worker_zdict)) for r in region_ids]
+
+def build_fragments_task(task):
+    return build_fragments(*task)
+
+def venn_rows(occupation_ids):
+    import infodemo
+    data = infodemo.get_datasets()
+    for id_occupation in occupation_ids:
+        info = data.occupationdata.get(id_occupation)
+        adwords_choosen = data.adwords.get(info["wordcloud_id"]) or {}
+        for id_similar, degree_of_overlap in (info["similar_occupations"] or {}).items():
+            adwords_similar = data.adwords.get(id_similar) or {}
+            overlap = infodemo.create_venn_overlap(adwords_choosen, adwords_similar, degree_of_overlap)
+            yield id_occupation, id_similar, degree_of_overlap, json.dumps(overlap, ensure_ascii = False)
+
+def precompute(filename = FRAGMENT_FILE, processes = None):
+    import infodemo
+    data = infodemo.get_datasets()
+    region_ids = region_choices(data)
+    occupation_ids = sorted(set(data.valid_occupations.values()))
+    tasks = [(o, region_ids) for o in occupation_ids]
+    zdict = compression_dictionary(occupation_ids)
+
+    temporary = f"{filename}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    connection = sqlite3.connect(temporary)
+    connection.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value)")
+    connection.execute("CREATE TABLE fragments (occupation_id TEXT, region_id TEXT, payload BLOB, PRIMARY KEY (occupation_id, region_id))")
+    connection.execute("CREATE TABLE venn (occupation_id TEXT, similar_id TEXT, degree_of_overlap REAL, overlap TEXT, PRIMARY KEY (occupation_id, similar_id))")
+
+    start = time.perf_counter()
+    written = 0
+    with multiprocessing.Pool(processes, initializer = init_worker, initargs = (zdict,)) as pool:
+        for rows in pool.imap_unordered(build_fragments_task, tasks, chunksize = 16):
+            connection.executemany("INSERT INTO fragments VALUES (?, ?, ?)", rows)
+            written += len(rows)
+            if written % (len(region_ids) * 250) == 0:
+                print(f"{written} fragment, {written / (time.perf_counter() - start):.0f}/s")
+    connection.executemany("INSERT INTO venn VALUES (?, ?, ?, ?)", venn_rows(occupation_ids))
+    connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ("fingerprint", dataset_fingerprint(data.files)),
+        ("zdict", zdict),
+        ("created", time.strftime("%Y-%m-%dT%H:%M:%S"))])
+    connection.commit()
+    connection.execute("VACUUM")
+    connection.close()
+    os.replace(temporary, filename)
+    print(f"Skrev {written} fragment till {filename} på {time.perf_counter() - start:.1f} s")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Förberäkna sidfragment för alla yrkesbenämningar och regioner.")
+    parser.add_argument("--file", default = FRAGMENT_FILE)
+    parser.add_argument("--processes", type = int, default = None)
+    args = parser.parse_args()
+    precompute(args.file, args.processes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Frågor mot dataseten utan Streamlit.
+
+Funktionerna tar en Datasets-instans och returnerar vanliga listor och dictar,
+så att samma uppslag kan användas av appen, av api.py och av skript. Okända
+id:n ger None eller tomma listor i stället för undantag.
+"""
+from concept_index import SWEDEN_ID
+
+def platsbanken_link(occupation_group_id, region_id = None):
+    if region_id == SWEDEN_ID:
+        region_id = None
+    link = f"https://arbetsformedlingen.se/platsbanken/annonser?p=5:{occupation_group_id}&q="
+    if region_id:
+        return link + "&l=2:" + region_id
+    return link
+
+def get_ads(data, occupation_group_id, location_id):
+    """Annonser nu och 2024 för yrkesgruppen i en kommun, ett län eller hela Sverige, som [nu, 2024]."""
+    return data.ad_index.get(occupation_group_id, location_id)
+
+def get_forecast(data, barometer_id, location_id):
+    """[jobbmöjligheter, prognos] från Yrkesbarometern, eller None."""
+    if not barometer_id:
+        return None
+    return data.forecast_index.get(barometer_id, location_id)
+
+def get_salary(data, ssyk_code):
+    """[10:e percentilen, genomsnitt, 90:e percentilen] för SSYK-koden, eller None."""
+    return data.ssyk_salary.get(ssyk_code)
+
+def list_locations(data, locality_id):
+    """Tätorten följd av dess grannar efter relevans och avstånd, eller [] för okänd tätort."""
+    if locality_id not in data.locality_index.localities:
+        return []
+    return data.locality_index.ranked(locality_id)
+
+def get_educations(data, ssyk_code, locality_id = None):
+    """Utbildningar per typ. Med locality_id bara de i pendlingsområdet, med avstånd i km."""
+    if not locality_id:
+        return {t: [dict(u) for u in value] for t, value in data.education_index.by_ssyk.get(ssyk_code, {}).items()}
+    near = data.education_index.near(ssyk_code, locality_id)
+    return {t: [{**u, "distance": d} for u, d in value] for t, value in near.items()}
+
+def similar_occupations(data, id_occupation, region_id = SWEDEN_ID):
+    """Närliggande yrken med annonser och prognos i regionen, sorterade på id.
+
+    labour_flow är sant för yrken vars yrkesgrupp många byter till från
+    yrkets egen grupp. None om yrket är okänt och [] om det saknar närliggande yrken.
+    """
+    info = data.occupationdata.get(id_occupation)
+    if info is None:
+        return None
+    if not info["similar_occupations"]:
+        return []
+    labour_flow_ssyk = data.labour_flow_sets.get(info["occupation_group"][0:4], frozenset())
+    similar = []
+    for k, overlap in sorted(info["similar_occupations"].items()):
+        info_similar = data.occupationdata.get(k)
+        group_id = info_similar["occupation_group_id"]
+        similar.append({
+            "id": k,
+            "name": info_similar["preferred_label"],
+            "overlap": overlap,
+            "description": info_similar["description"],
+            "esco_description": info_similar["esco_description"] == True,
+            "occupation_group_id": group_id,
+            "forecast": get_forecast(data, info_similar["barometer_id"], region_id),
+            "ads": get_ads(data, group_id, region_id),
+            "link": platsbanken_link(group_id, region_id),
+            "labour_flow": info_similar["occupation_group"][0:4] in labour_flow_ssyk})
+    return similar
+
+def occupation_summary(data, id_occupation, region_id = SWEDEN_ID):
+    """Yrkesbenämningen med yrkesgrupp, annonser, prognos och lön i regionen, eller None."""
+    info = data.occupationdata.get(id_occupation)
+    if info is None:
+        return None
+    ssyk_code = info["occupation_group"][0:4]
+    return {
+        "id": id_occupation,
+        "name": info["preferred_label"],
+        "occupation_group": info["occupation_group"],
+        "occupation_group_id": info["occupation_group_id"],
+        "occupation_field": info["occupation_field"],
+        "ssyk": ssyk_code,
+        "description": info["description"],
+        "barometer": info["barometer_name"] if info["barometer_id"] else None,
+        "region_id": region_id,
+        "ads": get_ads(data, info["occupation_group_id"], region_id),
+        "forecast": get_forecast(data, info["barometer_id"], region_id),
+        "salary": get_salary(data, ssyk_code),
+        "link": platsbanken_link(info["occupation_group_id"], region_id)}
@@ -0,0 +1,168 @@
+"""Binär ögonblicksbild av appens dataset.
+
+Bygg den offline efter att JSON-filerna uppdaterats:
+
+    python snapshot.py build
+    python snapshot.py benchmark
+
+Filen innehåller en JSON-header följd av ett pickle-block per dataset. Appen
+mappar filen i minnet och avkodar bara de dataset som efterfrågas. Varje block
+bär storlek, ändringstid och SHA-1 för sin JSON-källa; har källan ändrats
+används JSON-filen i stället.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import statistics
+import struct
+import sys
+import time
+from datastore import DATASET_FILES, import_data
+
+SNAPSHOT_FILE = "datasets.snapshot"
+MAGIC = b"YRKSNAP"
+FORMAT_VERSION = 1
+INTERN_MAX_LENGTH = 64
+
+def file_signature(filename):
+    status = os.stat(filename)
+    return [status.st_size, status.st_mtime_ns]
+
+def file_hash(filename):
+    with open(filename, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+def intern_strings(value):
+    # Taxonomi-id:n och namn upprepas i många dataset. Internerade strängar
+    # lagras en gång i pickle-blocket och delas i minnet efter laddning.
+    if isinstance(value, dict):
+        return {sys.intern(k): intern_strings(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [intern_strings(v) for v in value]
+    if isinstance(value, str) and len(value) <= INTERN_MAX_LENGTH:
+        return sys.intern(value)
+    return value
+
+def build_snapshot(filename = SNAPSHOT_FILE, files = DATASET_FILES):
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created": datetime.datetime.now().isoformat(),
+        "datasets": {}}
+    blocks = []
+    offset = 0
+    for name, source in files.items():
+        if not os.path.exists(source):
+            print(f"Hoppar över {name}: {source} saknas")
+            continue
+        block = pickle.dumps(intern_strings(import_data(source)), protocol = pickle.HIGHEST_PROTOCOL)
+        header["datasets"][name] = {
+            "source": source,
+            "sha1": file_hash(source),
+            "signature": file_signature(source),
+            "offset": offset,
+            "length": len(block)}
+        blocks.append(block)
+        offset += len(block)
+    header_bytes = json.dumps(header, ensure_ascii = False).encode("utf-8")
+    temporary = f"{filename}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<I", len(header_bytes)))
+        file.write(header_bytes)
+        for block in blocks:
+            file.write(block)
+    os.replace(temporary, filename)
+    return header
+
+class Snapshot:
+    def __init__(self, filename = SNAPSHOT_FILE):
+        with open(filename, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{filename} är ingen ögonblicksbild")
+        start = len(MAGIC) + 4
+        (header_length,) = struct.unpack("<I", self.buffer[len(MAGIC):start])
+        self.header = json.loads(self.buffer[start:start + header_length].decode("utf-8"))
+        if self.header["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"{filename} har formatversion {self.header['format_version']}, förväntade {FORMAT_VERSION}")
+        self.data_start = start + header_length
+        self.checked_sources = {}
+
+    def is_current(self, name, source = None):
+        """Sant om datasetet byggdes från source, som standard filen det byggdes från."""
+        entry = self.header["datasets"].get(name)
+        if not entry:
+            return False
+        source = source or entry["source"]
+        if (name, source) not in self.checked_sources:
+            if not os.path.exists(source) or file_signature(source) == entry["signature"]:
+                self.checked_sources[name, source] = True
+            else:
+                # Storlek eller ändringstid skiljer, t.ex. efter en ny utcheckning.
+                # Innehållet avgör.
+                self.checked_sources[name, source] = file_hash(source) == entry["sha1"]
+        return self.checked_sources[name, source]
+
+    def load(self, name, source = None):
+        """Avkoda ett dataset, eller None om det saknas eller är inaktuellt mot source."""
+        if not self.is_current(name, source):
+            return None
+        entry = self.header["datasets"][name]
+        start = self.data_start + entry["offset"]
+        return pickle.loads(self.buffer[start:start + entry["length"]])
+
+def open_snapshot(filename = SNAPSHOT_FILE):
+    if not os.path.exists(filename):
+        return None
+    try:
+        return Snapshot(filename)
+    except (OSError, ValueError, struct.error) as error:
+        print(f"Ögonblicksbilden kan inte användas, laddar JSON: {error}")
+        return None
+
+def load_all_json(files):
+    return {name: import_data(source) for name, source in files.items() if os.path.exists(source)}
+
+def load_all_snapshot(filename, files):
+    snapshot = Snapshot(filename)
+    return {name: snapshot.load(name) for name in files if name in snapshot.header["datasets"]}
+
+def benchmark(filename = SNAPSHOT_FILE, files = DATASET_FILES, repeat = 5):
+    def measure(loader):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            loader()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings), statistics.median(timings)
+
+    json_min, json_median = measure(lambda: load_all_json(files))
+    snapshot_min, snapshot_median = measure(lambda: load_all_snapshot(filename, files))
+    print(f"{'Laddare':<16}{'min ms':>10}{'median ms':>12}")
+    print(f"{'JSON':<16}{json_min:>10.1f}{json_median:>12.1f}")
+    print(f"{'Ögonblicksbild':<16}{snapshot_min:>10.1f}{snapshot_median:>12.1f}")
+    print(f"Uppsnabbning (median): {json_median / snapshot_median:.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Bygg och mät appens binära ögonblicksbild.")
+    parser.add_argument("command", choices = ["build", "benchmark"])
+    parser.add_argument("--file", default = SNAPSHOT_FILE)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        header = build_snapshot(args.file)
+        size = os.path.getsize(args.file) / 1e6
+        print(f"Skrev {args.file} ({len(header['datasets'])} dataset, {size:.1f} MB) på {time.perf_counter() - start:.1f} s")
+    else:
+        if not os.path.exists(args.file):
+            build_snapshot(args.file)
+        benchmark(args.file, repeat = args.repeat)
+
+if __name__ == "__main__":
+    main()
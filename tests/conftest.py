@@ -0,0 +1,20 @@
+import os
+import sys
+
+# Modulerna ligger direkt i repots rot och är inget installerat paket.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def pytest_addoption(parser):
+    parser.addoption("--run-slow", action = "store_true", help = "Kör även de långsamma mätningarna, t.ex. SUSA-data i 100 gångers storlek")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: långsam mätning som bara körs med --run-slow")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    import pytest
+    skip = pytest.mark.skip(reason = "kräver --run-slow")
+    for item in items:
+        if "slow" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,72 @@
+"""Ersättare för google.cloud.storage.Client med objekten i minnet.
+
+Stödjer det GCSBackend använder: bucket, blob, get_blob, list_blobs, exists,
+download_as_bytes med if_generation_match, upload_from_string och delete.
+Varje ändring av ett objekt ger ny generation och ny ETag. Med offline satt
+ger alla anrop ConnectionError, som när bucketen inte går att nå. downloads
+räknar nedladdningarna per objekt.
+"""
+import hashlib
+
+class StubClient:
+    def __init__(self):
+        self.buckets = {}
+        self.offline = False
+        self.downloads = {}
+
+    def bucket(self, name):
+        return self.buckets.setdefault(name, StubBucket(self, name))
+
+    def check_online(self):
+        if self.offline:
+            raise ConnectionError("bucketen går inte att nå")
+
+class StubBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.objects = {}
+        self.generation = 0
+
+    def put(self, name, data):
+        self.generation += 1
+        self.objects[name] = (data, self.generation)
+
+    def blob(self, name):
+        return StubBlob(self, name)
+
+    def get_blob(self, name):
+        self.client.check_online()
+        return StubBlob(self, name) if name in self.objects else None
+
+    def list_blobs(self, prefix = ""):
+        self.client.check_online()
+        return [StubBlob(self, name) for name in sorted(self.objects) if name.startswith(prefix)]
+
+class StubBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        data, self.generation = bucket.objects.get(name, (None, None))
+        self.etag = hashlib.md5(data).hexdigest() + f"-{self.generation}" if data is not None else None
+
+    def exists(self):
+        self.bucket.client.check_online()
+        return self.name in self.bucket.objects
+
+    def download_as_bytes(self, if_generation_match = None):
+        self.bucket.client.check_online()
+        data, generation = self.bucket.objects[self.name]
+        if if_generation_match is not None and generation != if_generation_match:
+            raise RuntimeError("412 Precondition Failed")
+        downloads = self.bucket.client.downloads
+        downloads[self.name] = downloads.get(self.name, 0) + 1
+        return data
+
+    def upload_from_string(self, data, content_type = None):
+        self.bucket.client.check_online()
+        self.bucket.put(self.name, data if isinstance(data, bytes) else data.encode("utf-8"))
+
+    def delete(self):
+        self.bucket.client.check_online()
+        del self.bucket.objects[self.name]
@@ -0,0 +1,93 @@
+"""Lokal ersättare för SUSA-navets API som delar ut inspelade svar sida för sida.
+
+Servern svarar på /infos och /events med posterna i tests/fixtures/susa och
+samma sidformat som SUSA: content, number, totalPages och totalElements.
+Fördröjning och fel kan injiceras per sökväg för att prova omförsök och
+samtidighet.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "susa")
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURE_DIR, f"{name}.json"), encoding = "utf-8") as file:
+        return json.load(file)
+
+class SusaServer:
+    """latency är sekunder per anrop. failures är {"/infos": n} där de n första anropen får 503."""
+
+    def __init__(self, items = None, latency = 0, failures = None):
+        self.items = items or {"/infos": load_fixture("infos"), "/events": load_fixture("events")}
+        self.latency = latency
+        self.failures = dict(failures or {})
+        self.requests = []
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.thread = threading.Thread(target = self.httpd.serve_forever, daemon = True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 så att klientens anslutningar kan återanvändas.
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                with server.lock:
+                    server.requests.append({
+                        "path": url.path, "query": query, "start": time.perf_counter(), "client_port": self.client_address[1],
+                        "accept_encoding": self.headers.get("Accept-Encoding", "")})
+                    failing = server.failures.get(url.path, 0) > 0
+                    if failing:
+                        server.failures[url.path] -= 1
+                if failing:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if url.path not in server.items:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                time.sleep(server.latency)
+                items = server.items[url.path]
+                page = int(query.get("page", ["0"])[0])
+                size = int(query.get("size", ["20"])[0])
+                body = json.dumps({
+                    "content": items[page * size:(page + 1) * size], "number": page,
+                    "totalPages": -(-len(items) // size), "totalElements": len(items)}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        return False
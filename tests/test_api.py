@@ -0,0 +1,146 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+import pytest
+import api
+from bulk_query import bulk_query
+from datastore import DATASET_FILES, Datasets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(ROOT, "tests", "fixtures", "api")
+SWEDEN = "i46j_HmG_v64"
+STOCKHOLM = "CifL_Rzy_Mku"
+ARKITEKT = "ghs4_JXU_BYt"
+DESIGNER = "GPNi_fJR_B2B"
+INGENJOR = "YcvM_Gqk_6U7"
+
+def fixture_datasets():
+    """Repots datasetfiler, men med tre yrkesbenämningar i stället för hela yrkesdatat."""
+    files = {name: os.path.join(ROOT, filename) for name, filename in DATASET_FILES.items()}
+    files["occupationdata"] = os.path.join(FIXTURE_DIR, "occupations.json")
+    files["adwords"] = os.path.join(FIXTURE_DIR, "adwords.json")
+    return Datasets(files = files)
+
+@pytest.fixture(scope = "module", autouse = True)
+def datasets():
+    api.datasets = fixture_datasets()
+    api.respond.cache_clear()
+    yield api.datasets
+    api.datasets = None
+    api.respond.cache_clear()
+
+async def request(path, query = "", method = "GET"):
+    """Anropa ASGI-appen direkt och returnera (status, headers, body)."""
+    messages = []
+    async def send(message):
+        messages.append(message)
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode("utf-8")}
+    await api.app(scope, None, send)
+    start, body = messages
+    return start["status"], dict(start["headers"]), body["body"]
+
+def get(path, query = ""):
+    return asyncio.run(request(path, query))
+
+def get_json(path, query = ""):
+    status, headers, body = get(path, query)
+    assert headers[b"content-type"].startswith(b"application/json")
+    return status, json.loads(body)
+
+def test_occupation():
+    status, body = get_json(f"/occupations/{ARKITEKT}", f"region={STOCKHOLM}")
+    assert status == 200
+    assert body["name"] == "Planeringsarkitekt"
+    assert body["region_id"] == STOCKHOLM
+    assert len(body["ads"]) == 2
+
+def test_unknown_occupation_is_404():
+    assert get_json("/occupations/okand")[0] == 404
+    assert get_json("/occupations/okand/similar")[0] == 404
+
+def test_unknown_region_is_400():
+    status, body = get_json(f"/occupations/{ARKITEKT}", "region=okand")
+    assert status == 400
+    assert "okand" in body["error"]
+    assert get_json(f"/occupations/{ARKITEKT}/similar", "region=okand")[0] == 400
+    assert get_json("/groups/DZVN_v5g_Fco/ads", "location=okand")[0] == 400
+
+def test_similar_occupations():
+    status, body = get_json(f"/occupations/{ARKITEKT}/similar", f"region={SWEDEN}")
+    assert status == 200
+    assert [(s["id"], s["overlap"]) for s in body] == [(DESIGNER, 1), (INGENJOR, 0.5)]
+
+def test_missing_similar_occupations_are_empty():
+    assert get_json(f"/occupations/{DESIGNER}/similar") == (200, [])
+    # similar_occupations är None i datat.
+    assert get_json(f"/occupations/{INGENJOR}/similar") == (200, [])
+
+def test_search_limit_is_validated():
+    assert get_json("/search", "q=arkitekt&limit=x")[0] == 400
+    status, body = get_json("/search", "q=arkitekt&limit=0")
+    assert status == 200 and len(body) == 1
+
+def test_unknown_route_and_method():
+    assert get_json("/okand")[0] == 404
+    status, _, _ = asyncio.run(request("/health", method = "POST"))
+    assert status == 405
+
+def test_unexpected_error_is_json_500(monkeypatch):
+    def broken(params):
+        raise RuntimeError("trasig")
+    monkeypatch.setattr(api, "ROUTES", [(("trasig",), broken)])
+    status, body = get_json("/trasig")
+    assert status == 500
+    assert body == {"error": "internal server error"}
+
+BULK_QUERY = f"occupations={ARKITEKT},{INGENJOR}&locations={STOCKHOLM},{SWEDEN}"
+
+def test_bulk_csv_round_trip():
+    status, headers, body = get("/bulk", BULK_QUERY + "&format=csv")
+    assert status == 200
+    assert headers[b"content-type"] == b"text/csv; charset=utf-8"
+    rows = list(csv.DictReader(io.StringIO(body.decode("utf-8"))))
+    assert [(r["occupation_id"], r["location_id"]) for r in rows] == [
+        (ARKITEKT, STOCKHOLM), (ARKITEKT, SWEDEN), (INGENJOR, STOCKHOLM), (INGENJOR, SWEDEN)]
+    assert rows[1]["location_name"] == "Sverige"
+    # CSV är standard.
+    assert get("/bulk", BULK_QUERY)[2] == body
+
+def test_bulk_parquet_round_trip():
+    parquet = pytest.importorskip("pyarrow.parquet")
+    status, headers, body = get("/bulk", BULK_QUERY + "&format=parquet")
+    assert status == 200
+    assert headers[b"content-type"] == b"application/vnd.apache.parquet"
+    table = parquet.read_table(io.BytesIO(body))
+    csv_rows = list(csv.DictReader(io.StringIO(get("/bulk", BULK_QUERY)[2].decode("utf-8"))))
+    assert table.column("occupation_id").to_pylist() == [r["occupation_id"] for r in csv_rows]
+    assert [str(v) for v in table.column("ads_now").to_pylist()] == [r["ads_now"] for r in csv_rows]
+
+def test_bulk_rejects_unknown_ids_and_formats():
+    assert get_json("/bulk", "locations=okand")[0] == 400
+    status, body = get_json("/bulk", BULK_QUERY + "&format=xlsx")
+    assert status == 400 and "xlsx" in body["error"]
+
+def test_event_loop_answers_while_bulk_runs(monkeypatch):
+    # En långsam korsprodukt får inte hålla andra förfrågningar väntande.
+    def slow_bulk_query(*args):
+        time.sleep(0.5)
+        return bulk_query(*args)
+    monkeypatch.setattr(api, "bulk_query", slow_bulk_query)
+
+    async def finished(path, query = "", delay = 0):
+        await asyncio.sleep(delay)
+        status, _, _ = await request(path, query)
+        return status, time.perf_counter()
+
+    async def concurrently():
+        return await asyncio.gather(finished("/bulk", BULK_QUERY), finished("/health", delay = 0.05))
+
+    start = time.perf_counter()
+    (bulk_status, bulk_done), (health_status, health_done) = asyncio.run(concurrently())
+    assert bulk_status == health_status == 200
+    assert bulk_done - start >= 0.5
+    assert health_done - start < 0.3
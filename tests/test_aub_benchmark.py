@@ -0,0 +1,33 @@
+"""Mätningar av SUSA-sammanslagningen på syntetiska svar, med pytest-benchmark.
+
+Dagens storlek och 10 gånger större körs alltid, 100 gånger större med --run-slow:
+
+    pip install pytest-benchmark
+    python -m pytest tests/test_aub_benchmark.py
+    python -m pytest tests/test_aub_benchmark.py --run-slow --benchmark-sort=name
+"""
+import pytest
+import aub_susa
+from aub_benchmark import BASE_INFOS, syntetiska_tillfällen, syntetiska_utbildningar
+
+pytest.importorskip("pytest_benchmark")
+
+SCALES = [1, 10, pytest.param(100, marks = pytest.mark.slow)]
+
+def join(count):
+    return aub_susa.aub_per_ssyk(
+        aub_susa.aub_utbildningar(syntetiska_utbildningar(count)), aub_susa.utbildningsorter(syntetiska_tillfällen(count)))
+
+def generate(count):
+    return sum(1 for _ in syntetiska_utbildningar(count)) + sum(1 for _ in syntetiska_tillfällen(count))
+
+# Posterna strömmas från generatorerna som i import_aub_from_susa. Genereringen
+# mäts för sig så att sammanslagningens andel kan läsas ut som skillnaden.
+@pytest.mark.parametrize("scale", SCALES)
+def test_benchmark_join(benchmark, scale):
+    result = benchmark.pedantic(join, args = (BASE_INFOS * scale,), rounds = 3 if scale < 100 else 1)
+    assert result
+
+@pytest.mark.parametrize("scale", SCALES)
+def test_benchmark_generation(benchmark, scale):
+    benchmark.pedantic(generate, args = (BASE_INFOS * scale,), rounds = 3 if scale < 100 else 1)
@@ -0,0 +1,29 @@
+import aub_susa
+
+def info(id, ssyk, namn = "Kurs"):
+    return {
+        "identifier": id,
+        "subject": [{"type": "AUB_Subject", "code": s} for s in ssyk],
+        "title": {"string": [{"content": namn}]},
+        "description": {"string": [{"content": "<![CDATA[Text]]>"}]},
+        "url": {"url": [{"content": f"https://example.org/{id}"}]}}
+
+def test_all_towns_are_kept():
+    result = aub_susa.aub_per_ssyk([info("a", ["5321"])], {"a": ["Växjö", "Kalmar", "Umeå"]})
+    assert [p["ort"] for p in result["5321"]] == ["Kalmar", "Umeå", "Växjö"]
+
+def test_record_is_shared_across_ssyk_codes():
+    index = aub_susa.aub_index(aub_susa.aub_kurser([info("a", ["5321", "7212", "8332"])], {"a": ["Kalmar"]}))
+    records = [index[(s, "Kalmar")][0] for s in ("5321", "7212", "8332")]
+    assert records[0] is records[1] is records[2]
+    assert records[0]["beskrivning"] == "Text"
+
+def test_courses_without_towns_or_ssyk_are_dropped():
+    result = aub_susa.aub_per_ssyk([info("a", ["5321"]), info("b", []), info("c", ["7212"])], {"a": ["Lund"], "b": ["Lund"]})
+    assert list(result) == ["5321"]
+
+def test_index_groups_by_ssyk_and_town():
+    kurser = aub_susa.aub_kurser([info("a", ["5321"]), info("b", ["5321"])], {"a": ["Lund", "Malmö"], "b": ["Lund"]})
+    index = aub_susa.aub_index(kurser)
+    assert sorted(index) == [("5321", "Lund"), ("5321", "Malmö")]
+    assert [p["url"] for p in index[("5321", "Lund")]] == ["https://example.org/a", "https://example.org/b"]
@@ -0,0 +1,64 @@
+import pytest
+import backends
+from backends import DatasetCache, FileBackend, GCSBackend, open_backend
+from gcs_stub import StubClient
+
+@pytest.fixture
+def client(monkeypatch):
+    client = StubClient()
+    monkeypatch.setattr(backends, "gcs_clients", {None: client})
+    return client
+
+def read(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+def test_unchanged_object_is_not_downloaded_again(client, tmp_path):
+    client.bucket("data").put("data/regions.json", b'{"a": 1}')
+    cache = DatasetCache(open_backend("gs://data/data"), str(tmp_path))
+    path = cache.fetch("regions.json")
+    assert read(path) == b'{"a": 1}'
+    assert cache.fetch("regions.json") == path
+    assert client.downloads == {"data/regions.json": 1}
+
+def test_changed_object_replaces_cached_file(client, tmp_path):
+    bucket = client.bucket("data")
+    bucket.put("regions.json", b'{"a": 1}')
+    cache = DatasetCache(GCSBackend("data"), str(tmp_path))
+    cache.fetch("regions.json")
+    bucket.put("regions.json", b'{"a": 2}')
+    assert read(cache.fetch("regions.json")) == b'{"a": 2}'
+    assert client.downloads == {"regions.json": 2}
+
+def test_cached_file_is_used_when_offline(client, tmp_path):
+    client.bucket("data").put("regions.json", b'{"a": 1}')
+    cache = DatasetCache(GCSBackend("data"), str(tmp_path))
+    path = cache.fetch("regions.json")
+    client.offline = True
+    assert cache.fetch("regions.json") == path
+    assert read(path) == b'{"a": 1}'
+
+def test_offline_without_cached_file_fails(client, tmp_path):
+    client.bucket("data").put("regions.json", b'{"a": 1}')
+    client.offline = True
+    with pytest.raises(ConnectionError):
+        DatasetCache(GCSBackend("data"), str(tmp_path)).fetch("regions.json")
+
+def test_missing_object_raises(client, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        DatasetCache(GCSBackend("data"), str(tmp_path)).fetch("regions.json")
+
+def test_file_backend_etag_follows_changes(tmp_path):
+    source = FileBackend(str(tmp_path / "source"))
+    source.write("regions.json", b'{"a": 1}')
+    cache = DatasetCache(source, str(tmp_path / "cache"))
+    path = cache.fetch("regions.json")
+    etag = read(f"{path}.etag")
+    assert cache.fetch("regions.json") == path and read(f"{path}.etag") == etag
+    source.write("regions.json", b'{"a": 22}')
+    assert read(cache.fetch("regions.json")) == b'{"a": 22}'
+
+def test_memory_backends_are_shared_by_address():
+    open_backend("memory://test-delad").write("feedback/1.ndjson", b"{}\n")
+    assert open_backend("memory://test-delad").read("feedback/1.ndjson") == b"{}\n"
+    assert open_backend("memory://test-annan").read("feedback/1.ndjson") is None
@@ -0,0 +1,51 @@
+import json
+import os
+import pytest
+from dataset_manager import DatasetManager, pin_files
+from datastore import Datasets
+
+def write_json(path, data):
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / "regions.json")
+    write_json(path, {"Skåne län": "CaRE_1nn_cSU"})
+    return path
+
+def pinned_datasets(source, directory):
+    os.makedirs(directory)
+    files = pin_files({"regions": source}, directory)
+    status = os.stat(files["regions"])
+    return Datasets(files = files, signatures = {"regions": [status.st_size, status.st_mtime_ns]})
+
+def test_replaced_source_does_not_reach_pinned_version(source, tmp_path):
+    data = pinned_datasets(source, str(tmp_path / "v1"))
+    write_json(source, {"Skåne län": "ny"})
+    assert data.regions == {"Skåne län": "CaRE_1nn_cSU"}
+
+def test_source_rewritten_in_place_is_refused(source, tmp_path):
+    data = pinned_datasets(source, str(tmp_path / "v1"))
+    with open(source, "w") as file:
+        json.dump({"Skåne län": "på plats"}, file)
+    with pytest.raises(RuntimeError, match = "os.replace"):
+        data.regions
+
+def test_dropped_version_removes_its_directory(source, tmp_path):
+    version_dir = str(tmp_path / "versions")
+    manager = DatasetManager(
+        lambda signature, directory: pinned_datasets(source, os.path.join(directory, "pinned")),
+        lambda: os.stat(source).st_mtime_ns, interval = 3600, version_dir = version_dir)
+    first = manager.acquire()
+    write_json(source, {"Skåne län": "ny"})
+    os.utime(source, ns = (0, first.signature + 10**9))
+    manager.check()
+    assert manager.active.number == 2
+    assert first.data.regions == {"Skåne län": "CaRE_1nn_cSU"}
+    assert manager.active.data.regions == {"Skåne län": "ny"}
+    manager.release(first)
+    assert not os.path.exists(first.directory)
+    assert os.listdir(version_dir) == [os.path.basename(manager.active.directory)]
@@ -0,0 +1,80 @@
+import json
+import time
+from backends import FileBackend, MemoryBackend
+from feedback_store import ENTRY_PREFIX, FEEDBACK_FILE, FeedbackStore, compact, from_ndjson, read_buffer_file, to_ndjson
+
+def wait_for(predicate, timeout = 5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "väntade förgäves"
+        time.sleep(0.01)
+
+class FlakyBackend(MemoryBackend):
+    """MemoryBackend där de failures första skrivningarna misslyckas."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def write(self, name, data, content_type = None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("backend nere")
+        super().write(name, data, content_type)
+
+def test_submits_are_written_in_batches():
+    backend = MemoryBackend()
+    store = FeedbackStore(backend, batch_size = 3, flush_interval = 10)
+    ids = [store.submit({"n": n}) for n in range(3)]
+    wait_for(lambda: backend.list(ENTRY_PREFIX))
+    assert len(backend.list(ENTRY_PREFIX)) == 1
+    store.submit({"n": 3})
+    store.flush()
+    assert len(backend.list(ENTRY_PREFIX)) == 2
+    batches = [[e["n"] for e in from_ndjson(backend.read(name))] for name in backend.list(ENTRY_PREFIX)]
+    assert sorted(batches) == [[0, 1, 2], [3]]
+    assert set(ids) <= {e["id"] for e in store.entries()}
+
+def test_failed_write_is_requeued(tmp_path):
+    backend = FlakyBackend(failures = 1)
+    buffer_path = str(tmp_path / "buffer.ndjson")
+    store = FeedbackStore(backend, batch_size = 2, flush_interval = 0.05, buffer_path = buffer_path)
+    store.submit({"n": 1})
+    store.submit({"n": 2})
+    wait_for(lambda: len(store.entries()) == 2)
+    assert backend.failures == 0
+    assert sorted(e["n"] for e in store.entries()) == [1, 2]
+    wait_for(lambda: read_buffer_file(buffer_path) == [])
+
+def test_leftover_buffer_is_recovered(tmp_path):
+    # En tidigare process dog innan posterna skrevs. Den sista raden avbröts mitt i skrivningen.
+    buffer_path = tmp_path / "buffer.ndjson"
+    buffer_path.write_bytes(to_ndjson([{"id": "a", "n": 1}, {"id": "b", "n": 2}]) + b'{"id": "c", "n"')
+    backend = FileBackend(str(tmp_path / "remote"))
+    store = FeedbackStore(backend, flush_interval = 0.05, buffer_path = str(buffer_path))
+    wait_for(lambda: len(store.entries()) == 2)
+    assert [e["id"] for e in store.entries()] == ["a", "b"]
+    wait_for(lambda: buffer_path.read_bytes() == b"")
+
+def test_written_entries_leave_other_entries_in_buffer(tmp_path):
+    buffer_path = tmp_path / "buffer.ndjson"
+    store = FeedbackStore(MemoryBackend(), flush_interval = 10, buffer_path = str(buffer_path))
+    # En annan process som delar katalogen lägger till en post som inte skrivits än.
+    with open(buffer_path, "ab") as file:
+        file.write(to_ndjson([{"id": "other", "n": 0}]))
+    store.submit({"n": 1})
+    store.flush()
+    assert [e["id"] for e in read_buffer_file(str(buffer_path))] == ["other"]
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_compact_merges_objects_and_skips_duplicate_ids():
+    backend = MemoryBackend({
+        FEEDBACK_FILE: json.dumps([{"id": "a", "n": 1}]).encode("utf-8"),
+        f"{ENTRY_PREFIX}1.ndjson": to_ndjson([{"id": "a", "n": 1}, {"id": "b", "n": 2}]),
+        f"{ENTRY_PREFIX}2.ndjson": to_ndjson([{"id": "b", "n": 2}, {"id": "c", "n": 3}])})
+    added, objects = compact(backend)
+    assert (added, objects) == (2, 2)
+    assert backend.list(ENTRY_PREFIX) == []
+    assert [e["id"] for e in json.loads(backend.read(FEEDBACK_FILE))] == ["a", "b", "c"]
+    # En omkörning hittar inget nytt.
+    assert compact(backend) == (0, 0)
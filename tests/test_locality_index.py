@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+import numpy as np
+from concept_index import ConceptIds
+from locality_index import RELEVANCE_ORDER, CommuteAdIndex
+
+def commute_index(municipality_ids):
+    """Tre orter i rad där varje ort har nästa som granne med hög relevans."""
+    localities = SimpleNamespace(
+        localities = {"A": 0, "B": 1, "C": 2},
+        municipality_ids = municipality_ids,
+        ranked_offsets = [0, 1, 2, 2],
+        ranked_neighbours = np.array([1, 2]),
+        ranked_relevance = np.array([RELEVANCE_ORDER["hög"]] * 2))
+    municipalities = ConceptIds(["k1", "k2", "k3"])
+    ads = SimpleNamespace(
+        groups = ConceptIds(["g"]),
+        municipalities = municipalities,
+        # Kolumnen efter kommunerna är ett län och ska inte räknas.
+        ads_now = np.array([[1, 10, 100, 1000]], dtype = np.int32),
+        ads_2024 = np.array([[2, 20, 200, 2000]], dtype = np.int32))
+    return CommuteAdIndex(localities, ads)
+
+def test_commute_area_sums_own_and_neighbouring_municipalities():
+    index = commute_index(["k1", "k2", "k3"])
+    assert index.municipalities("A") == ["k1", "k2"]
+    assert index.get("A", "g") == [11, 22]
+    assert index.get("C", "g") == [100, 200]
+    assert index.unknown_municipalities == []
+
+def test_unknown_municipalities_are_skipped(capsys):
+    index = commute_index(["k1", "okand", "k3"])
+    # Orten i den okända kommunen får bara grannens kommun, inte hela raden.
+    assert index.municipalities("B") == ["k3"]
+    assert index.municipalities("A") == ["k1"]
+    assert index.get("B", "g") == [100, 200]
+    assert index.unknown_municipalities == ["okand"]
+    assert "okand" in capsys.readouterr().out
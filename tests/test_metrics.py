@@ -0,0 +1,30 @@
+import json
+import pytest
+from metrics import BUCKETS, Histogram, Metrics
+
+def reject_constant(name):
+    raise ValueError(f"ogiltig JSON-konstant {name}")
+
+def test_quantile_is_upper_bucket_bound():
+    histogram = Histogram(BUCKETS)
+    for seconds in (0.002, 0.003, 0.004, 0.2):
+        histogram.observe(seconds)
+    assert histogram.quantile(0.5) == 0.005
+    assert histogram.quantile(0.95) == 0.25
+
+def test_quantile_in_overflow_bucket_is_none():
+    histogram = Histogram(BUCKETS)
+    histogram.observe(0.002)
+    histogram.observe(60)
+    assert histogram.quantile(0.5) == 0.005
+    assert histogram.quantile(0.95) is None
+
+@pytest.mark.parametrize("seconds", [0.0005, 3, 60, 3600])
+def test_as_dict_is_strict_json(seconds):
+    metrics = Metrics()
+    metrics.observe("render", seconds)
+    metrics.observe_size("session_state", 5e9)
+    metrics.set_gauge("dataset_version", {}, 2)
+    data = json.loads(json.dumps(metrics.as_dict()), parse_constant = reject_constant)
+    assert data["functions"]["render"]["calls"] == 1
+    json.loads(metrics.as_json(), parse_constant = reject_constant)
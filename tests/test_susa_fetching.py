@@ -0,0 +1,49 @@
+import time
+import pytest
+import requests
+import aub_susa
+from susa_server import SusaServer, load_fixture
+
+LATENCY = 0.2
+
+@pytest.fixture(autouse = True)
+def small_pages(monkeypatch):
+    monkeypatch.setattr(aub_susa, "PAGE_SIZE", 2)
+
+def test_endpoints_are_fetched_concurrently():
+    with SusaServer(latency = LATENCY) as server:
+        start = time.perf_counter()
+        aub_susa.import_aub_from_susa(server.url)
+        elapsed = time.perf_counter() - start
+    infos = [r["start"] for r in server.requests if r["path"] == "/infos"]
+    events = [r["start"] for r in server.requests if r["path"] == "/events"]
+    # 3 sidor infos och 4 sidor events: i följd minst 7 x LATENCY, samtidigt ungefär 4 x LATENCY.
+    assert elapsed < (len(infos) + len(events)) * LATENCY * 0.85
+    assert min(events) < max(infos) and min(infos) < max(events)
+
+def test_failed_requests_are_retried():
+    with SusaServer(failures = {"/infos": 2, "/events": 1}) as server, aub_susa.skapa_session(backoff = 0) as session:
+        infos = list(aub_susa.hämta_yrkesutbildningar(server.url, session = session))
+        events = list(aub_susa.hämta_utbildningstillfällen(server.url, session = session))
+    assert len(infos) == len(load_fixture("infos"))
+    assert len(events) == len(load_fixture("events"))
+    assert sum(r["path"] == "/infos" for r in server.requests) == 3 + 2
+
+def test_retries_are_bounded():
+    with SusaServer(failures = {"/infos": 10}) as server, aub_susa.skapa_session(retries = 2, backoff = 0) as session:
+        with pytest.raises(requests.exceptions.RetryError):
+            list(aub_susa.hämta_yrkesutbildningar(server.url, session = session))
+    assert len(server.requests) == 3
+
+def test_session_asks_for_gzip_and_reuses_connections():
+    with SusaServer() as server, aub_susa.skapa_session() as session:
+        list(aub_susa.hämta_utbildningstillfällen(server.url, session = session))
+    assert all("gzip" in r["accept_encoding"] for r in server.requests)
+    assert len({r["client_port"] for r in server.requests}) == 1
+
+def test_request_times_are_recorded():
+    progress = aub_susa.Progress("infos")
+    with SusaServer(latency = LATENCY) as server:
+        list(aub_susa.hämta_yrkesutbildningar(server.url, progress))
+    assert len(progress.request_times) == progress.pages == 3
+    assert min(progress.request_times) >= LATENCY
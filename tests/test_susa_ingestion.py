@@ -0,0 +1,122 @@
+import copy
+import pytest
+import aub_susa
+from susa_server import SusaServer, load_fixture
+
+def post(id, namn, beskrivning, ort):
+    return {"utbildningsnamn": namn, "beskrivning": beskrivning, "url": f"https://example.org/{id}", "ort": ort}
+
+SVETSARE = ("i.aub.1", "Svetsare grund", "Lär dig svetsa.")
+LAGER = ("i.aub.2", "Lagerarbete", "Truck och lager.")
+
+EXPECTED = {
+    "5321": [post(*SVETSARE, "Kalmar"), post(*LAGER, "Luleå"), post(*LAGER, "Umeå"), post(*SVETSARE, "Växjö")],
+    "7212": [post(*SVETSARE, "Kalmar"), post(*SVETSARE, "Växjö")]}
+
+@pytest.fixture(autouse = True)
+def small_pages(monkeypatch):
+    monkeypatch.setattr(aub_susa, "PAGE_SIZE", 2)
+
+def test_import_from_fixture_server():
+    with SusaServer() as server:
+        assert aub_susa.import_aub_from_susa(server.url) == EXPECTED
+    pages = {path: sorted(int(r["query"]["page"][0]) for r in server.requests if r["path"] == path)
+             for path in ("/infos", "/events")}
+    assert pages == {"/infos": [0, 1, 2], "/events": [0, 1, 2, 3]}
+
+def test_streaming_matches_full_payload_join():
+    full = aub_susa.spara_aub_med_ssyk({"content": load_fixture("infos")}, {"content": load_fixture("events")})
+    assert full == EXPECTED
+
+def test_pages_are_fetched_lazily():
+    with SusaServer() as server:
+        items = aub_susa.ladda_ner_sidor(f"{server.url}/events", {})
+        next(items)
+        assert len(server.requests) == 1
+        assert len(list(items)) == len(load_fixture("events")) - 1
+
+def test_progress_counts_pages_items_and_bytes():
+    progress = aub_susa.Progress("events")
+    with SusaServer() as server:
+        events = list(aub_susa.hämta_utbildningstillfällen(server.url, progress))
+    assert len(events) == progress.items == 7
+    assert progress.pages == 4
+    assert progress.bytes > 0
+    assert len(progress.request_times) == 4
+
+def test_towns_are_merged_over_events():
+    orter = aub_susa.utbildningsorter(e["content"]["educationEvent"] for e in load_fixture("events"))
+    assert orter["i.aub.1"] == ["Kalmar", "Växjö"]
+    assert "i.aub.5" not in orter
+
+# Inkrementell uppdatering med uppdatera_aub, aub_patch och slå_ihop.
+
+ANDRA_UTBILDNINGAR = {
+    "5321": [{"utbildningstyp": "yh", "utbildningsnamn": "Svetsteknik", "ort": "Göteborg"}],
+    "9999": [{"utbildningstyp": "yh", "utbildningsnamn": "Annat", "ort": "Lund"}]}
+
+def fixture_items():
+    return {"/infos": load_fixture("infos"), "/events": load_fixture("events")}
+
+def uppdatera(server, state_file, utbildningsdata):
+    """En körning som main: patchen slås ihop och tillståndet sparas."""
+    patch, fullständig, tillstånd = aub_susa.uppdatera_aub(server.url, str(state_file))
+    utbildningsdata = aub_susa.slå_ihop(copy.deepcopy(utbildningsdata), patch, fullständig)
+    aub_susa.skriv_json(str(state_file), tillstånd)
+    return patch, fullständig, utbildningsdata
+
+def full_ombyggnad(server, tmp_path):
+    _, fullständig, utbildningsdata = uppdatera(server, tmp_path / "ombyggnad.json", ANDRA_UTBILDNINGAR)
+    assert fullständig
+    (tmp_path / "ombyggnad.json").unlink()
+    return utbildningsdata
+
+def aub(utbildningsdata):
+    return {s: [{k: v for k, v in u.items() if k != "utbildningstyp"} for u in poster if u["utbildningstyp"] == "aub"]
+            for s, poster in utbildningsdata.items() if any(u["utbildningstyp"] == "aub" for u in poster)}
+
+def test_first_update_is_full(tmp_path):
+    with SusaServer() as server:
+        patch, fullständig, utbildningsdata = uppdatera(server, tmp_path / "state.json", ANDRA_UTBILDNINGAR)
+    assert fullständig
+    assert {s for s, poster in patch.items() if poster} == {"5321", "7212"}
+    assert aub(utbildningsdata) == EXPECTED
+    assert utbildningsdata["9999"] == ANDRA_UTBILDNINGAR["9999"]
+    assert [u["ort"] for u in utbildningsdata["5321"]] == ["Göteborg", "Kalmar", "Luleå", "Umeå", "Växjö"]
+
+def test_unchanged_rerun_gives_empty_patch(tmp_path):
+    state_file = tmp_path / "state.json"
+    with SusaServer() as server:
+        _, _, första = uppdatera(server, state_file, ANDRA_UTBILDNINGAR)
+        patch, fullständig, andra = uppdatera(server, state_file, första)
+    assert patch == {}
+    assert not fullständig
+    assert andra == första
+
+def test_changed_education_patches_only_its_ssyk_codes(tmp_path):
+    state_file = tmp_path / "state.json"
+    with SusaServer(items = fixture_items()) as server:
+        _, _, utbildningsdata = uppdatera(server, state_file, ANDRA_UTBILDNINGAR)
+        lager = server.items["/infos"][1]["content"]["educationInfo"]
+        lager["description"]["string"][0]["content"] = "<![CDATA[Truck, lager och logistik.]]>"
+        patch, fullständig, utbildningsdata = uppdatera(server, state_file, utbildningsdata)
+        assert utbildningsdata == full_ombyggnad(server, tmp_path)
+    assert not fullständig
+    assert set(patch) == {"5321"}
+    assert [u["beskrivning"] for u in aub(utbildningsdata)["5321"] if u["utbildningsnamn"] == "Lagerarbete"] == ["Truck, lager och logistik."] * 2
+
+def test_removed_education_is_dropped(tmp_path):
+    state_file = tmp_path / "state.json"
+    with SusaServer(items = fixture_items()) as server:
+        _, _, utbildningsdata = uppdatera(server, state_file, ANDRA_UTBILDNINGAR)
+        # Svetsaren och dess tillfällen finns inte med i nästa hämtning.
+        server.items["/infos"] = [i for i in server.items["/infos"] if i["content"]["educationInfo"]["identifier"] != "i.aub.1"]
+        server.items["/events"] = [e for e in server.items["/events"] if e["content"]["educationEvent"]["education"] != "i.aub.1"]
+        patch, fullständig, utbildningsdata = uppdatera(server, state_file, utbildningsdata)
+        assert utbildningsdata == full_ombyggnad(server, tmp_path)
+    assert not fullständig
+    assert set(patch) == {"5321", "7212"}
+    assert patch["7212"] == []
+    assert "7212" not in utbildningsdata
+    assert aub(utbildningsdata)["5321"] == [post(*LAGER, "Luleå"), post(*LAGER, "Umeå")]
+    assert utbildningsdata["5321"][0] == ANDRA_UTBILDNINGAR["5321"][0]
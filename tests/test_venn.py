@@ -0,0 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor
+import matplotlib.pyplot as plt
+import infodemo
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def venn_data(i):
+    words = [f"ord{j}" for j in range(20)]
+    overlap = [words[0:i % 6 + 1], words[6:6 + i % 8], words[14:14 + i % 6]]
+    return infodemo.create_venn_data(f"Yrke {i}", f"Närliggande yrke {i}", overlap)
+
+def test_parallel_renders_match_serial_renders():
+    cases = [venn_data(i) for i in range(24)]
+    serial = [infodemo.render_venn(c) for c in cases]
+    with ThreadPoolExecutor(12) as executor:
+        parallel = list(executor.map(infodemo.render_venn, cases * 2))
+    assert all(image.startswith(PNG_SIGNATURE) for image in parallel)
+    assert parallel == serial * 2
+
+def test_rendering_leaves_no_pyplot_figures():
+    plt.close("all")
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(infodemo.render_venn, [venn_data(i) for i in range(16)]))
+    assert plt.get_fignums() == []
+
+def test_empty_regions_are_skipped():
+    data = infodemo.create_venn_data("A", "B", [[], ["a", "b"], []])
+    assert infodemo.render_venn(data).startswith(PNG_SIGNATURE)
@@ -0,0 +1,67 @@
+"""Förrenderade ordmoln för alla wordcloud_id i all_wordclouds_v25.json.
+
+Rendera om efter att annonsorden uppdaterats:
+
+    python wordclouds.py --force
+
+Bilderna sparas som WebP i data/ bredvid Yrkesbarometerns diagram. Filnamnet
+innehåller ett fingeravtryck av orden bilden ritades från, så när annonsorden
+ändrats hittar appen ingen bild och renderar live tills bilden renderats om.
+"""
+import argparse
+import glob
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from wordcloud import WordCloud
+from datastore import DATASET_FILES, import_data, wordcloud_fingerprint
+
+WORDCLOUD_DIR = "data"
+
+def wordcloud_path(wordcloud_id, fingerprint):
+    """Bilden för wordcloud_id ritad från orden med fingeravtrycket, se wordcloud_fingerprint."""
+    return os.path.join(WORDCLOUD_DIR, f"ordmoln_{wordcloud_id}_{fingerprint}.webp")
+
+def stale_wordclouds(wordcloud_id, current):
+    """Bilder för wordcloud_id ritade från andra ord, även de äldre utan fingeravtryck."""
+    paths = glob.glob(os.path.join(WORDCLOUD_DIR, f"ordmoln_{wordcloud_id}_*.webp"))
+    paths += glob.glob(os.path.join(WORDCLOUD_DIR, f"ordmoln_{wordcloud_id}.webp"))
+    return [p for p in paths if p != current]
+
+def render_wordcloud(words):
+    wordcloud = WordCloud(width = 800, height = 800,
+                          background_color = 'white',
+                          prefer_horizontal = 1).generate_from_frequencies(words)
+    image = io.BytesIO()
+    wordcloud.to_image().save(image, format = "WEBP", quality = 85, method = 6)
+    return image.getvalue()
+
+def save_wordcloud(task):
+    wordcloud_id, words = task
+    path = wordcloud_path(wordcloud_id, wordcloud_fingerprint(words))
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(render_wordcloud(words))
+    os.replace(temporary, path)
+    for stale in stale_wordclouds(wordcloud_id, path):
+        os.remove(stale)
+    return wordcloud_id
+
+def main():
+    parser = argparse.ArgumentParser(description = "Förrendera ordmoln till data/.")
+    parser.add_argument("--force", action = "store_true", help = "Rendera om även befintliga bilder")
+    parser.add_argument("--processes", type = int, default = None)
+    args = parser.parse_args()
+
+    adwords = import_data(DATASET_FILES["adwords"])
+    tasks = [(k, v) for k, v in adwords.items() if v and (args.force or not os.path.exists(wordcloud_path(k, wordcloud_fingerprint(v))))]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.processes) as executor:
+        for done, _ in enumerate(executor.map(save_wordcloud, tasks, chunksize = 8), start = 1):
+            if done % 250 == 0:
+                print(f"{done}/{len(tasks)} ordmoln")
+    print(f"Renderade {len(tasks)} ordmoln på {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+    main()